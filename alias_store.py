@@ -0,0 +1,160 @@
+#persistent store of the names resolved by the fuzzy matching, kept across runs in a sqlite file.
+#every alias maps a normalised source name, in a domain ("meetings", "nationalities") and an
+#optional context (the year of a race), to the target it resolved to and its score. the matching
+#looks the names up here first and only scores the ones it has not seen, so reruns on the same
+#inputs skip nearly all the fuzzy work, and tuning a threshold keeps the names already resolved.
+#manual overrides (score NULL) take priority and are never replaced by the matching; an alias whose
+#target is no longer among the candidates is matched again (and replaced, unless it is manual)
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aliases (
+    domain TEXT NOT NULL,
+    context TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    score REAL,
+    manual INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (domain, context, source)
+)
+"""
+
+
+def normalise(value) -> str:
+    #lower case, single spaces
+    return " ".join(str(value).lower().split())
+
+
+def _context(context) -> str:
+    return "" if context is None else str(context)
+
+
+class AliasStore:
+    #only the path is kept: every call opens its own connection, so the store can be handed to the
+    #worker processes and several steps can use it at the same time
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    @contextmanager
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                conn.execute(SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+    def aliases(self, domain: str) -> "Aliases":
+        #every alias of the domain, read at once
+        with self._connect() as conn:
+            rows = conn.execute("SELECT context, source, target, manual FROM aliases WHERE domain = ?", (domain,))
+            return Aliases(self, domain, {(context, source): (target, bool(manual)) for context, source, target, manual in rows})
+
+    def override(self, domain: str, source: str, target: str, context=None) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?, NULL, 1)",
+                         (domain, _context(context), normalise(source), str(target)))
+
+    def remove(self, domain: str, source: str, context=None) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM aliases WHERE domain = ? AND context = ? AND source = ?",
+                         (domain, _context(context), normalise(source)))
+
+    def rows(self, domain: str = None) -> list:
+        with self._connect() as conn:
+            query = "SELECT domain, context, source, target, score, manual FROM aliases"
+            args = ()
+            if domain is not None:
+                query, args = query + " WHERE domain = ?", (domain,)
+            return conn.execute(query + " ORDER BY domain, context, source", args).fetchall()
+
+    def overrides_version(self) -> str:
+        #hash of the manual overrides, which change what the matching steps write. a store that
+        #doesn't exist yet is not created
+        digest = hashlib.sha256()
+        if self.path.exists():
+            for row in self.rows():
+                if row[5]:
+                    digest.update(repr(row[:4]).encode("utf-8"))
+        return digest.hexdigest()
+
+
+class Aliases:
+    #the aliases of one domain, in memory: the matching looks the names up with positions() and
+    #records the ones it resolved with add(), which are written back by save()
+    def __init__(self, store: AliasStore, domain: str, known: dict):
+        self.store = store
+        self.domain = domain
+        self.known = known
+        self.new = {}
+        self.hits = 0
+
+    def positions(self, sources, targets, context=None):
+        #position in targets of the target stored for every source, -1 when the source is unknown
+        #(or missing) or its target is no longer among the candidates
+        import numpy as np
+        import pandas as pd
+
+        index = {}
+        for pos, target in enumerate(targets):
+            if not pd.isna(target):
+                index.setdefault(normalise(target), pos)
+        context = _context(context)
+        positions = np.full(len(sources), -1, dtype=np.int64)
+        for i, source in enumerate(sources):
+            if pd.isna(source):
+                continue
+            target, manual = self.known.get((context, normalise(source)), (None, False))
+            if target is not None and normalise(target) in index:
+                positions[i] = index[normalise(target)]
+            elif manual:
+                print(f"[WARN] Alias override {source!r} -> {target!r} ({self.domain} {context}) "
+                      "is not among the candidates, matching it instead")
+        self.hits += int((positions >= 0).sum())
+        return positions
+
+    def add(self, sources, targets, scores, context=None) -> None:
+        context = _context(context)
+        for source, target, score in zip(sources, targets, scores):
+            self.new[(context, normalise(source))] = (str(target), float(score))
+
+    def save(self) -> None:
+        #the new aliases in a single transaction; manual overrides are kept
+        if not self.new:
+            return
+        with self.store._connect() as conn:
+            conn.executemany(
+                "INSERT INTO aliases VALUES (?, ?, ?, ?, ?, 0) ON CONFLICT (domain, context, source) "
+                "DO UPDATE SET target = excluded.target, score = excluded.score WHERE manual = 0",
+                [(self.domain, context, source, target, score) for (context, source), (target, score) in self.new.items()])
+        self.known.update({key: (target, False) for key, (target, _) in self.new.items()})
+        self.new = {}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lists and edits the manual overrides of the alias store")
+    parser.add_argument("store", help="sqlite file of the alias store")
+    parser.add_argument("action", choices=["list", "override", "remove"])
+    parser.add_argument("domain", nargs="?", default=None, help="meetings or nationalities")
+    parser.add_argument("source", nargs="?", default=None, help="name as found in the input files")
+    parser.add_argument("target", nargs="?", default=None, help="meeting_key or nationality it resolves to")
+    parser.add_argument("--context", default=None, help="year of the race, for the meetings")
+    args = parser.parse_args()
+
+    store = AliasStore(args.store)
+    if args.action == "list":
+        for domain, context, source, target, score, manual in store.rows(args.domain):
+            print(f"{domain}\t{context}\t{source}\t{target}\t{'manual' if manual else f'{score:.1f}'}")
+    elif args.domain is None or args.source is None or (args.action == "override" and args.target is None):
+        parser.error(f"{args.action} needs the domain, the source" + (" and the target" if args.action == "override" else ""))
+    elif args.action == "override":
+        store.override(args.domain, args.source, args.target, args.context)
+    else:
+        store.remove(args.domain, args.source, args.context)
@@ -0,0 +1,214 @@
+#benchmark of the pipeline on synthetic inputs (see synthetic_inputs.py): time and peak memory of
+#every ETLTransformation step and of the load of every staging table, written as JSON so that the
+#runs of different versions can be compared (--compare). memory is measured with tracemalloc,
+#which slows the steps down a little: compare runs with each other, not with the timings of main.py
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pipeline import STEPS, build_dag
+from staging_format import staging_filename
+from synthetic_inputs import generate_inputs
+
+REGRESSION_RATIO = 1.2    #--compare warns about entries that got this much slower or bigger
+MIN_SECONDS = 0.05        #entries faster than this are too noisy to compare
+
+
+class RecordingCursor:
+    #stand-in for a psycopg2 cursor: the COPY streams are read to the end and their size recorded
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, statement, stream, size=8192):
+        while True:
+            data = stream.read(size)
+            if not data:
+                break
+            self.connection.copied_bytes += len(data)
+
+    def execute(self, statement, params=None):
+        #never reached in replace mode, see check_loader
+        raise NotImplementedError("the recorded COPY stand-in only supports COPY")
+
+
+class RecordingConnection:
+    #stand-in for a psycopg2 connection, used when no database is given
+    def __init__(self):
+        self.copied_bytes = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+
+def _measure(func, *args) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        func(*args)
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_mb": round(peak / 2**20, 2)}
+
+
+def _step_order(input_dir: Path, output_dir: Path, staging_format: str) -> list:
+    #every step after the ones it reads from
+    deps = build_dag(list(STEPS), input_dir, output_dir, staging_format)
+    order = []
+    while len(order) < len(deps):
+        order.append(next(s for s in deps if s not in order and deps[s] <= set(order)))
+    return order
+
+
+def benchmark_steps(input_dir: Path, output_dir: Path, **etl_options) -> dict:
+    from etl_class import ETLTransformation
+
+    etl = ETLTransformation(input_dir, output_dir, **etl_options)
+    results = {}
+    for step in _step_order(input_dir, output_dir, etl_options.get("staging_format", "csv")):
+        print(f"Running {step}")
+        results[step] = _measure(getattr(etl, step))
+    return results
+
+
+def check_loader(dsn: str = None) -> None:
+    #the recorded stand-in can only take the COPY streams of the replace mode: the upsert merge
+    #runs queries in the database, so it needs one
+    import etl_loading
+
+    if dsn is None and etl_loading.LOAD_MODE != "replace":
+        raise SystemExit(f"[ERROR] etl_loading.LOAD_MODE is {etl_loading.LOAD_MODE!r}, which can only be benchmarked "
+                         "against a database: pass --dsn, or set LOAD_MODE to 'replace'")
+
+
+def benchmark_load(output_dir: Path, staging_format: str = "csv", dsn: str = None) -> dict:
+    #loads every staging table with etl_loading. without a dsn the COPY streams go to the recorded
+    #stand-in; with one they go to the database inside a transaction that is rolled back at the end
+    import etl_loading
+
+    paths = sorted((output_dir / staging_filename(spec["output"], staging_format) for spec in STEPS.values()),
+                   key=lambda p: etl_loading.sort_key(str(p)))
+    targets = [etl_loading.parse_table_from_filename(str(path)) for path in paths]
+    if dsn is None:
+        conn = RecordingConnection()
+        #the catalog is the staging files themselves, so the column checks need no query
+        etl_loading.CATALOG = etl_loading.CatalogSnapshot({schema for schema, _ in targets})
+        for path, target in zip(paths, targets):
+            header = etl_loading.staging_header(str(path))
+            etl_loading.CATALOG.columns[target] = [(col, "text") for col in header]
+    else:
+        import psycopg2
+        conn = psycopg2.connect(dsn)
+        with conn.cursor() as cur:
+            cur.execute("SET CONSTRAINTS ALL DEFERRED;")
+        etl_loading.prefetch_catalog(conn, {schema for schema, _ in targets})
+        etl_loading.check_targets_exist(conn, targets)
+        etl_loading.maybe_truncate(conn, targets)
+
+    results = {}
+    try:
+        for path, (schema, table) in zip(paths, targets):
+            print(f"Loading {path} -> {schema}.{table}")
+            results[table] = _measure(etl_loading.load_file_into_table, conn, schema, table, str(path))
+            results[table]["file_mb"] = round(path.stat().st_size / 2**20, 2)
+            if dsn is None:
+                results[table]["copied_mb"] = round(conn.copied_bytes / 2**20, 2)
+                conn.copied_bytes = 0
+    finally:
+        if dsn is not None:
+            conn.rollback()
+            conn.close()
+    return results
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict) -> list:
+    #entries of the new run that are REGRESSION_RATIO times slower or bigger than in the old one
+    regressions = []
+    for section in ("steps", "load"):
+        for name, entry in new.get(section, {}).items():
+            before = old.get(section, {}).get(name)
+            if before is None:
+                continue
+            for metric in ("seconds", "peak_mb"):
+                if metric == "seconds" and max(before[metric], entry[metric]) < MIN_SECONDS:
+                    continue
+                if before[metric] > 0 and entry[metric] / before[metric] >= REGRESSION_RATIO:
+                    regressions.append(f"{section}/{name}: {metric} {before[metric]} -> {entry[metric]} "
+                                       f"({entry[metric] / before[metric]:.2f}x)")
+    return regressions
+
+
+def run_benchmark(seasons: int, drivers: int, work_dir: Path, dsn: str = None, **etl_options) -> dict:
+    import pandas as pd
+
+    check_loader(dsn)
+    input_dir, output_dir = work_dir / "input_files", work_dir / "output_files"
+    start = time.perf_counter()
+    inputs = generate_inputs(input_dir, seasons=seasons, drivers=drivers)
+    print(f"Generated {sum(inputs.values())} input rows in {time.perf_counter() - start:.2f}s")
+    steps = benchmark_steps(input_dir, output_dir, **etl_options)
+    load = benchmark_load(output_dir, etl_options.get("staging_format", "csv"), dsn)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "params": {"seasons": seasons, "drivers": drivers, "loader": "postgres" if dsn else "recorded",
+                   **{k: v for k, v in etl_options.items() if v is not None}},
+        "inputs": inputs,
+        "steps": steps,
+        "load": load,
+        "total_seconds": {"steps": round(sum(s["seconds"] for s in steps.values()), 4),
+                          "load": round(sum(t["seconds"] for t in load.values()), 4)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline on synthetic inputs")
+    parser.add_argument("--seasons", type=int, default=3, help="number of generated seasons")
+    parser.add_argument("--drivers", type=int, default=20, help="number of drivers in every race")
+    parser.add_argument("--output", default="bench_output.json", help="where the results are written")
+    parser.add_argument("--work-dir", default=None, help="keep the generated files here instead of a temporary directory")
+    parser.add_argument("--dsn", default=None, help="load into this postgres (rolled back) instead of the recorded COPY stand-in")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream lap times and speed this many rows at a time")
+    parser.add_argument("--staging-format", choices=["csv", "parquet"], default="csv", help="format of the staging tables")
+    parser.add_argument("--compare", default=None, help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    options = dict(chunksize=args.chunksize, staging_format=args.staging_format)
+    if args.work_dir:
+        results = run_benchmark(args.seasons, args.drivers, Path(args.work_dir), args.dsn, **options)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run_benchmark(args.seasons, args.drivers, Path(tmp), args.dsn, **options)
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"Steps: {results['total_seconds']['steps']:.2f}s, load: {results['total_seconds']['load']:.2f}s, "
+          f"results written to {args.output}")
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text()), results)
+        for line in regressions:
+            print(f"[WARN] {line}")
+        if not regressions:
+            print(f"No regressions against {args.compare}")
@@ -0,0 +1,132 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pipeline import PipelineError
+
+#what happens to rows that share their natural key: keep the first one, keep the last one, or fail
+#when the rows of a key have different values (rows repeated as they are are always dropped)
+DEDUPE_POLICIES = ("first", "last", "fail")
+
+#the index saved by a run is pending until the staging tables are loaded: runs only read the
+#committed index, so a batch that was not loaded is produced again by the next run
+PENDING_SUFFIX = ".pending.npy"
+
+
+class DuplicateKeyError(PipelineError):
+    pass
+
+
+def hash_rows(df: pd.DataFrame) -> np.ndarray:
+    #64 bit hash of every row, computed on the values only (not the index)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def canonical_text(df: pd.DataFrame) -> pd.DataFrame:
+    #the values as text, the same whatever dtype pandas gave the column: a column read as text
+    #because of a \N in the batch, as int64 or as float64 because of a blank gives "1" for 1.
+    #integral floats lose their ".0", and \N is missing like a blank
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype.kind == "f":
+            integral = np.isfinite(series) & (series == series.round())
+            text = series.astype("string").mask(integral, series.where(integral).astype("Int64").astype("string"))
+        else:
+            text = series.astype("string")
+        columns[col] = text.mask(text == r"\N")
+    return pd.DataFrame(columns, index=df.index)
+
+
+def conflicting_keys(key_hashes: np.ndarray, row_hashes: np.ndarray, index: "SeenRowIndex" = None) -> np.ndarray:
+    #mask of the rows whose key comes with different values: inside the batch, or in index
+    pairs = pd.DataFrame({"key": key_hashes, "row": row_hashes}).drop_duplicates()
+    conflict = np.isin(key_hashes, pairs["key"][pairs["key"].duplicated()].to_numpy())
+    if index is not None:
+        conflict |= index.conflicts(key_hashes, row_hashes)
+    return conflict
+
+
+class SeenRowIndex:
+    #sorted array with the hashes of the rows already kept, used to drop duplicates across the
+    #chunks of a file without keeping the rows themselves (8 bytes per distinct row). the hashes
+    #can be keys, with the hash of the values of their row alongside (0 when not given), so that
+    #a key coming back with other values is found. it can be saved as .npy to find the rows of
+    #later input batches that were already produced by a run
+    def __init__(self):
+        self._seen = np.empty(0, dtype=np.uint64)
+        self._values = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        pos = np.searchsorted(self._seen, hashes)
+        pos[pos == len(self._seen)] = 0
+        return (self._seen[pos] == hashes) if len(self._seen) else np.zeros(len(hashes), dtype=bool)
+
+    def conflicts(self, hashes: np.ndarray, values: np.ndarray) -> np.ndarray:
+        #mask of the hashes already in the index with other values
+        if not len(self._seen):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(self._seen, hashes)
+        pos[pos == len(self._seen)] = 0
+        return (self._seen[pos] == hashes) & (self._values[pos] != values)
+
+    def _insert(self, hashes: np.ndarray, values: np.ndarray) -> None:
+        #hashes not in the index yet, once each
+        if values is None:
+            values = np.zeros(len(hashes), dtype=np.uint64)
+        seen = np.concatenate([self._seen, hashes])
+        order = np.argsort(seen, kind="stable")
+        self._seen, self._values = seen[order], np.concatenate([self._values, values])[order]
+
+    def add(self, hashes: np.ndarray, values: np.ndarray = None) -> None:
+        new = ~pd.Series(hashes).duplicated().to_numpy() & ~self.contains(hashes)
+        self._insert(hashes[new], values[new] if values is not None else None)
+
+    def add_new(self, hashes: np.ndarray, values: np.ndarray = None) -> np.ndarray:
+        #mask of the rows seen for the first time (first occurrence inside the batch included),
+        #which are then added to the index
+        first = ~pd.Series(hashes).duplicated().to_numpy()
+        new = first & ~self.contains(hashes)
+        self._insert(hashes[new], values[new] if values is not None else None)
+        return new
+
+    def save(self, path: Path) -> None:
+        #written to a temporary file first, like the manifest
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.stack([self._seen, self._values]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SeenRowIndex":
+        #empty index when the file doesn't exist yet
+        index = cls()
+        if Path(path).exists():
+            index._seen, index._values = np.load(path)
+        return index
+
+
+def pending_path(path: Path) -> Path:
+    #"drivers_staging.keys.npy" -> "drivers_staging.keys.pending.npy"
+    path = Path(path)
+    return path.with_name(path.name[:-len(".npy")] + PENDING_SUFFIX)
+
+
+def commit_seen_index(path: Path) -> bool:
+    #adds the pending keys of a table to its committed index, once the staging table is loaded;
+    #False when nothing is pending
+    pending = pending_path(path)
+    if not pending.exists():
+        return False
+    index, new = SeenRowIndex.load(path), SeenRowIndex.load(pending)
+    index.add(new._seen, new._values)
+    index.save(path)
+    pending.unlink()
+    return True
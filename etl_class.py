@@ -1,177 +1,433 @@
 import pandas as pd
 import numpy as np
+from collections import defaultdict
+from contextlib import nullcontext
 from pathlib import Path
-from rapidfuzz import fuzz, process
-from utility import convert_into_ms
+from utility import cast_series, convert_series_into_ms
 from utility import split_and_clean
+from temporal import DATE_FORMAT, TIMESTAMP_FORMAT, format_temporal, parse_datetime, split_datetime, to_date
+from matching import match_by_year, resolve_distinct
+from alias_store import AliasStore
+from staging_cache import StagingCache
+from dedupe import (DEDUPE_POLICIES, DuplicateKeyError, SeenRowIndex, canonical_text, conflicting_keys, hash_rows,
+                    pending_path)
+from pipeline import PARTITIONED_OUTPUTS, STAGING_INPUTS, STEPS
+from schemas import READ_SCHEMAS
+from table_specs import SPEC_KEYS, TABLE_SPECS
+from validation import REJECTS_DIR, TABLE_CHECKS, check_rules, validate
+from profiling import StepProfiler
+from staging_format import (STAGING_SUFFIXES, PartitionedStagingWriter, StagingWriter, check_format, partition_dirname,
+                            read_staging, remove_partitions, staging_filename, write_staging)
 
 class ETLTransformation:
-    def __init__(self, input_dir: str, output_dir: str):
+    def __init__(self, input_dir: str, output_dir: str, match_workers: int = 1,
+                 cache_entries: int = 8, cache_max_bytes: int = None, chunksize: int = None,
+                 staging_format: str = "csv", sink=None, write_files: bool = True,
+                 profile: bool = False, profile_step: str = None, partition_seasons: bool = False,
+                 dedupe_policy: str = "first", seen_index_dir: str = None, alias_store: str = None):
+        check_format(staging_format)
+        if dedupe_policy not in DEDUPE_POLICIES:
+            raise ValueError(f"Unknown dedupe policy {dedupe_policy!r}, expected one of {DEDUPE_POLICIES}")
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
+        #number of processes used to score the per-year blocks of the fuzzy matching
+        self.match_workers = match_workers
+        #staging frames produced (or read) in this run, reused by the steps that depend on them
+        self.staging_cache = StagingCache(cache_entries, cache_max_bytes)
+        #rows per chunk for the steps that can stream their input (lap times, speed), None reads it whole
+        self.chunksize = chunksize
+        #format of the staging tables written and read back by the steps ("csv" or "parquet")
+        self.staging_format = staging_format
+        #optional loader (e.g. etl_loading.PostgresSink) that receives every staging frame as soon as
+        #it is produced; with write_files=False the staging files are not written at all
+        self.sink = sink
+        self.write_files = write_files
+        #per-step measures (see profiling.py), None when profiling is off so that the hooks cost
+        #nothing; profile_step also dumps the cProfile stats of that step into the output directory
+        self.profiler = StepProfiler() if profile else None
+        self.profile_step = profile_step
+        #write the big fact tables (PARTITIONED_OUTPUTS) as one file per season instead of one file
+        self.partition_seasons = partition_seasons
+        #rows sharing the natural key of their table (TABLE_SPECS "key") keep the first or the last
+        #one, or fail the step
+        self.dedupe_policy = dedupe_policy
+        #with a directory, the inputs are appended batches: the key hashes of the rows produced are
+        #kept there (one .npy per table) and the keys produced by earlier runs are dropped ("first"),
+        #replaced ("last") or fail the step. tables read back by other steps are always produced whole
+        self.seen_index_dir = Path(seen_index_dir) if seen_index_dir is not None else None
+        #sqlite file of the names resolved by the fuzzy matching (see alias_store.py): the names
+        #resolved by earlier runs, and the manual overrides, are looked up instead of scored
+        self.alias_store = AliasStore(alias_store) if alias_store is not None else None
+        #rows rejected by the checks of every table (see validation.py), until the table is written
+        self._rejects = defaultdict(list)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-    def _read_csv(self, filename: str) -> pd.DataFrame:
-        #reads csv from the input directory
-        return pd.read_csv(self.input_dir / filename)
-
-    def _write_csv(self, df: pd.DataFrame, output_filename: str) -> None:
-        #writes a dataframe to a csv in the output directory
-        df.to_csv(self.output_dir / output_filename, index=False)
-
-    def constructors_results_processing (self) -> None:
-        #read the file constructor_result.csv
-        df = self._read_csv("constructor_results.csv")
-
-        #remove the unnecessary columns, status
-        unnecessary_col = ["status"]
-        df = df.drop(columns = unnecessary_col)
-        
-        #check for duplicate
-        df = df.drop_duplicates()
-        
-        #conversions of the column point from float to integer
-        df['points'] = df['points'].round().astype('Int64')
-        
-        #columns renaming
-        rename_map = {
-            'constructorResultsId': 'constructors_results_id',
-            'raceId': 'race_id',
-            'constructorId': 'constructor_id',
-            'points': 'points'
-        }
-        df = df.rename(columns=rename_map)
-        
-        #columns reording
-        correct_order = ['constructors_results_id', 'race_id', 'constructor_id', 'points']
-        df = df[correct_order]
-        
-        #save the results
-        self._write_csv(df, "constructors_results_staging.csv")
-    
-    def constructors_standings_processing (self) -> None:
-        #read the file constructor_standings.csv
-        df = self._read_csv("constructor_standings.csv")
-        
-        #remove the unnecessary columns, status
-        unnecessary_col = ["positionText"]
-        df = df.drop(columns = unnecessary_col)
-        
-        #check for duplicate
-        df = df.drop_duplicates()
-        
-        #conversions of the column point from float to integer
-        df['points'] = df['points'].round().astype('Int64')
-        
-        #renaming columns
-        rename_map = {
-            'constructorStandingsId': 'constructors_standings_id',
-            'raceId': 'race_id',
-            'constructorId': 'constructor_id',
-            'points': 'points',
-            'position': 'pos',
-            'wins': 'wins'
-        }
-        df = df.rename(columns=rename_map)
-
-        #save the results
-        self._write_csv(df, "constructors_standings_staging.csv")
+    def run_step(self, step: str) -> dict:
+        #runs a processing method, returns its profiling record (None when profiling is off)
+        method = getattr(self, step)
+        if self.profiler is None and step != self.profile_step:
+            method()
+            return None
+        profiler = self.profiler or StepProfiler()
+        profile_path = self.output_dir / f"{step}.prof" if step == self.profile_step else None
+        with profiler.step(step, profile_path) as record:
+            method()
+        return record if self.profiler is not None else None
+
+    def _count(self, **counters) -> None:
+        if self.profiler is not None:
+            self.profiler.count(**counters)
+
+    def _aliases(self, domain: str):
+        #aliases of the domain, None without an alias store
+        return self.alias_store.aliases(domain) if self.alias_store is not None else None
+
+    def _save_aliases(self, aliases) -> None:
+        #writes back the names resolved by the matching
+        if aliases is not None:
+            self._count(alias_hits=aliases.hits, aliases_added=len(aliases.new))
+            aliases.save()
+
+    def _drop_duplicates(self, df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+        #drop_duplicates that counts the removed rows when profiling
+        result = df.drop_duplicates(**kwargs)
+        if self.profiler is not None:
+            self.profiler.count(duplicates_removed=len(df) - len(result))
+        return result
+
+    def _dedupe_key(self, df: pd.DataFrame, key: list, output_filename: str, index: SeenRowIndex = None) -> pd.DataFrame:
+        #keeps one row per natural key according to dedupe_policy, hashing only the key columns
+        #(whole rows too with "fail" or an index); index holds the keys of the earlier runs and
+        #receives the keys kept
+        hashes = hash_rows(df[key])
+        values = self._row_values(df, index)
+        self._check_conflicts(df, key, hashes, values, output_filename, index)
+        duplicated = pd.Series(hashes).duplicated(keep="last" if self.dedupe_policy == "last" else "first").to_numpy()
+        earlier = index.contains(hashes) if index is not None else np.zeros(len(df), dtype=bool)
+        keep = ~duplicated if self.dedupe_policy == "last" else ~duplicated & ~earlier
+        self._count(duplicates_removed=len(df) - keep.sum())
+        if index is not None:
+            index.add(hashes[keep], values[keep])
+        return df[keep]
+
+    def _row_values(self, df: pd.DataFrame, index: SeenRowIndex = None):
+        #hashes of the whole rows, needed to tell a repeated row from a key with other values. they
+        #are computed on the text of the values, which doesn't depend on the dtypes of the batch
+        return hash_rows(canonical_text(df)) if self.dedupe_policy == "fail" or index is not None else None
+
+    def _check_conflicts(self, df: pd.DataFrame, key: list, hashes, values, output_filename: str,
+                         index: SeenRowIndex = None) -> None:
+        #with the "fail" policy, rows sharing their key (in the frame or with an earlier run) must be
+        #the same row
+        if self.dedupe_policy != "fail":
+            return
+        conflict = conflicting_keys(hashes, values, index)
+        if conflict.any():
+            samples = df.loc[conflict, key].drop_duplicates()
+            raise DuplicateKeyError(
+                f"{output_filename}: {len(samples)} keys {key} have rows with different values, e.g. "
+                f"{samples.head(5).to_dict('records')} (dedupe policy 'fail')")
+
+    def _seen_index_path(self, output_filename: str) -> Path:
+        #persisted key index of a table, None when the table is produced whole
+        if self.seen_index_dir is None or output_filename in STAGING_INPUTS:
+            return None
+        return self.seen_index_dir / f"{Path(output_filename).stem}.keys.npy"
+
+    def _read_csv(self, filename: str, columns: list = None) -> pd.DataFrame:
+        #reads csv from the input directory, parsing only the columns declared for the file in
+        #READ_SCHEMAS (or the ones requested) with their declared dtypes
+        schema = READ_SCHEMAS.get(filename, {})
+        df = pd.read_csv(self.input_dir / filename, usecols=columns or schema.get("usecols"),
+                         dtype=schema.get("dtype"))
+        if self.profiler is not None:
+            self.profiler.count(rows_in=len(df), bytes_read=(self.input_dir / filename).stat().st_size)
+        return df
+
+    def _read_staging(self, filename: str, columns: list = None) -> pd.DataFrame:
+        #returns a staging table (or only some of its columns) from the cache, parsing the file
+        #(output directory first, then input directory) only the first time it is needed in the run
+        df = self.staging_cache.get(filename, columns)
+        if df is not None:
+            self._count(rows_in=len(df))
+            return df
+        path = self.output_dir / staging_filename(filename, self.staging_format)
+        if not path.exists():
+            path = self.input_dir / staging_filename(filename, self.staging_format)
+        if self.profiler is not None:
+            self.profiler.count(bytes_read=path.stat().st_size)
+        if columns is not None and self.staging_cache.max_entries <= 0:
+            #nothing is cached, so only the requested columns are read
+            df = read_staging(path, self.staging_format, columns)
+            self._count(rows_in=len(df))
+            return df
+        df = read_staging(path, self.staging_format)
+        self._count(rows_in=len(df))
+        self.staging_cache.put(filename, df)
+        return df.copy() if columns is None else df[columns].copy()
+
+    def _stream_staging(self, filename: str, output_filename: str, process_chunk, columns: list = None,
+                        key: list = None, index: SeenRowIndex = None) -> None:
+        #streaming version of read -> drop_duplicates -> process -> write, for the big files:
+        #the input is read `chunksize` rows at a time (with fixed dtypes, so that a value hashes
+        #the same in every chunk) and every processed chunk is appended to the staging table and/or
+        #handed to the sink right away. duplicates across chunks are found through the hashes of
+        #the rows already written. columns works as in _read_csv. with a key, the duplicates are
+        #found on the key of the processed rows instead, against index when given (earlier runs)
+        def processed_chunks(writer):
+            seen = SeenRowIndex() if index is None else index
+            #declared dtypes are fixed for every chunk, the other columns are kept as text
+            schema = READ_SCHEMAS.get(filename, {})
+            dtype = defaultdict(lambda: str, schema.get("dtype", {}))
+            for chunk in pd.read_csv(self.input_dir / filename, chunksize=self.chunksize,
+                                     usecols=columns or schema.get("usecols"), dtype=dtype):
+                self._count(rows_in=len(chunk))
+                if key is None:
+                    new = seen.add_new(hash_rows(chunk))
+                    self._count(duplicates_removed=len(chunk) - new.sum())
+                    chunk = process_chunk(chunk[new])
+                else:
+                    chunk = process_chunk(chunk)
+                    hashes = hash_rows(chunk[key])
+                    values = self._row_values(chunk, index)
+                    self._check_conflicts(chunk, key, hashes, values, output_filename, seen)
+                    new = seen.add_new(hashes, values)
+                    self._count(duplicates_removed=len(chunk) - new.sum())
+                    chunk = chunk[new]
+                self._count(rows_out=len(chunk))
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+
+        with (self._staging_writer(output_filename) if self.write_files else nullcontext()) as writer:
+            chunks = processed_chunks(writer)
+            if self.sink is not None:
+                self.sink.write_stream(output_filename, chunks)
+            for _ in chunks:
+                pass
+        if self.profiler is not None:
+            self.profiler.count(bytes_read=(self.input_dir / filename).stat().st_size,
+                                bytes_written=self._output_bytes(output_filename) if self.write_files else 0)
+        self._write_rejects(output_filename)
+        #the frame is never held as a whole, so there is nothing to cache
+        self.staging_cache.discard(output_filename)
+
+    def _write_staging(self, df: pd.DataFrame, output_filename: str) -> None:
+        #writes a dataframe to the output directory in the staging format, the file stays the
+        #durable output while the frame is kept in the cache for the steps that read it later
+        if self.write_files and self._partitioned(output_filename):
+            with self._staging_writer(output_filename) as writer:
+                writer.write(df)
+        elif self.write_files:
+            self._clear_other_layout(output_filename)
+            write_staging(df, self.output_dir / staging_filename(output_filename, self.staging_format), self.staging_format)
+        if self.profiler is not None:
+            self.profiler.count(rows_out=len(df), bytes_written=self._output_bytes(output_filename) if self.write_files else 0)
+        self._write_rejects(output_filename)
+        if self.sink is not None:
+            self.sink.write(output_filename, df)
+        #only the tables read by other steps are kept, and without a file to fall back on they
+        #can't leave the cache
+        if output_filename in STAGING_INPUTS:
+            self.staging_cache.put(output_filename, df, pinned=not self.write_files)
+
+    def _partitioned(self, output_filename: str) -> bool:
+        return self.partition_seasons and output_filename in PARTITIONED_OUTPUTS
+
+    def _season_labels(self):
+        #function returning the season of every row of a frame, through the race_id -> year
+        #mapping of the races staging table ("unknown" for the races that are not there)
+        races = self._read_staging("races_staging.csv", columns=["race_id", "year"])
+        years = races.set_index("race_id")["year"]
+        return lambda df: df["race_id"].map(years).astype("Int64").astype("string").fillna("unknown")
+
+    def _clear_other_layout(self, output_filename: str) -> None:
+        #a table leaves no file of a previous run in another format or layout behind, the loader
+        #would load them all: a table written as one file removes its season files and its file in
+        #the other formats, a partitioned table its single files (the writer removes the old seasons)
+        for staging_format in STAGING_SUFFIXES:
+            if staging_format != self.staging_format or self._partitioned(output_filename):
+                (self.output_dir / staging_filename(output_filename, staging_format)).unlink(missing_ok=True)
+        if output_filename in PARTITIONED_OUTPUTS and not self._partitioned(output_filename):
+            remove_partitions(self.output_dir / partition_dirname(output_filename))
+
+    def _staging_writer(self, output_filename: str):
+        self._clear_other_layout(output_filename)
+        if self._partitioned(output_filename):
+            return PartitionedStagingWriter(self.output_dir / partition_dirname(output_filename),
+                                            self.staging_format, self._season_labels())
+        return StagingWriter(self.output_dir / staging_filename(output_filename, self.staging_format), self.staging_format)
+
+    def _output_bytes(self, output_filename: str) -> int:
+        if self._partitioned(output_filename):
+            return sum(p.stat().st_size for p in (self.output_dir / partition_dirname(output_filename)).iterdir())
+        return (self.output_dir / staging_filename(output_filename, self.staging_format)).stat().st_size
+
+    def _convert_into_ms(self, df: pd.DataFrame, columns: list, output_filename: str) -> None:
+        #converts the M:SS.mmm columns into ms in one pass per column, reporting the rejected values
+        for col in columns:
+            df[col], rejected = convert_series_into_ms(df[col])
+            if rejected:
+                print(f"[WARN] {output_filename}: {rejected} malformed values in {col} set to NULL")
+
+    def _validate(self, df: pd.DataFrame, output_filename: str) -> pd.DataFrame:
+        #applies the checks of the table (TABLE_CHECKS) and keeps the rejected rows for _write_rejects
+        rules = TABLE_CHECKS.get(output_filename)
+        if not rules:
+            return df
+        check_rules(output_filename, rules)
+        df, rejects, counts = validate(df, rules)
+        if len(rejects):
+            self._rejects[output_filename].append((rejects, counts))
+        return df
+
+    def _write_rejects(self, output_filename: str) -> None:
+        #rejects/<table>_rejects.csv with the rows rejected while producing the table (the file
+        #of an earlier run is removed when nothing was rejected), and the count of every rule
+        path = self.output_dir / REJECTS_DIR / f"{Path(output_filename).stem.removesuffix('_staging')}_rejects.csv"
+        batches = self._rejects.pop(output_filename, [])
+        if not batches:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(exist_ok=True)
+        rejects = pd.concat([rejects for rejects, _ in batches], ignore_index=True)
+        format_temporal(rejects).to_csv(path, index=False)
+        counts = {name: sum(c[name] for _, c in batches) for name in batches[0][1]}
+        summary = ", ".join(f"{name}: {count}" for name, count in counts.items() if count)
+        print(f"[WARN] {output_filename}: {len(rejects)} rows rejected ({summary}), see {path}")
+        self._count(rows_rejected=len(rejects))
+
+    def _parse_datetime(self, series: pd.Series, fmt: str, output_filename: str) -> pd.Series:
+        #parses a date or timestamp column in one pass, reporting the rejected values
+        parsed, rejected = parse_datetime(series, fmt)
+        if rejected:
+            print(f"[WARN] {output_filename}: {rejected} malformed values in {series.name} set to NULL")
+        return parsed
+
+    def _run_spec(self, step: str) -> None:
+        #runs a step described in TABLE_SPECS: the source is read with only the kept columns and the
+        #compiled transformation runs once on the whole frame, or on every chunk when streaming
+        spec = TABLE_SPECS[step]
+        output_filename = STEPS[step]["output"]
+        transform = self._compile_spec(spec, output_filename)
+        key = spec.get("key")
+        dedupe = "key" if key else spec.get("dedupe", "input")
+        index_path = self._seen_index_path(output_filename) if key else None
+        index = SeenRowIndex.load(index_path) if index_path is not None else None
+        stream = spec.get("stream") and self.chunksize
+        if stream and key and self.dedupe_policy == "last":
+            print(f"[WARN] {output_filename}: keeping the last row of every key needs the whole table, not streamed")
+            stream = False
+
+        if stream:
+            self._stream_staging(spec["source"], output_filename, transform, columns=spec.get("columns"),
+                                 key=key, index=index)
+        else:
+            df = self._read_csv(spec["source"], columns=spec.get("columns"))
+            if dedupe == "input":
+                df = self._drop_duplicates(df)
+            df = transform(df)
+            if dedupe == "output":
+                df = self._drop_duplicates(df)
+            elif dedupe == "key":
+                df = self._dedupe_key(df, key, output_filename, index)
+            self._write_staging(df, output_filename)
+        if index is not None:
+            #committed once the table is loaded (see dedupe.commit_seen_index)
+            index.save(pending_path(index_path))
+        self._mark_seen_index(output_filename, index_path)
+
+    def _mark_seen_index(self, output_filename: str, index_path: Path) -> None:
+        #a staging table produced with the key index only holds the keys earlier runs had not
+        #produced: "<table>.seen_index" next to it names the directory of the index, so that the
+        #loader merges the table instead of replacing it and commits the index once it is loaded
+        if not self.write_files:
+            return
+        marker = self.output_dir / f"{Path(output_filename).stem}.seen_index"
+        if index_path is not None:
+            marker.write_text(str(index_path.parent.resolve()), encoding="utf-8")
+        elif marker.exists():
+            marker.unlink()
+
+    def _compile_spec(self, spec: dict, output_filename: str):
+        #checks the spec and returns the function that applies it to a frame, in the order
+        #rename -> casts -> checks -> replace -> ms -> dates -> joins -> order. the joined staging tables
+        #are read once here, not once per chunk
+        unknown = set(spec) - SPEC_KEYS
+        if unknown:
+            raise ValueError(f"{output_filename}: unknown spec keys {sorted(unknown)}")
+        if spec.get("dedupe", "input") not in ("input", "output"):
+            raise ValueError(f"{output_filename}: dedupe must be 'input' or 'output'")
+        if spec.get("stream") and spec.get("dedupe", "input") != "input":
+            raise ValueError(f"{output_filename}: a streamed step can only drop duplicates of its input")
+        if spec.get("key") and "dedupe" in spec:
+            raise ValueError(f"{output_filename}: a step with a key drops duplicates by key, not by 'dedupe'")
+        missing = set(spec.get("key", [])) - set(spec.get("order", spec.get("key", [])))
+        if missing:
+            raise ValueError(f"{output_filename}: key columns {sorted(missing)} are not in the output")
+
+        rename = spec.get("rename")
+        casts = spec.get("casts", {})
+        replace = spec.get("replace", {})
+        ms_columns = spec.get("ms", [])
+        date_columns = spec.get("dates", [])
+        order = spec.get("order")
+        joins = [(self._read_staging(join["table"], columns=[*join["columns"], join["on"]]), join["on"])
+                 for join in spec.get("joins", [])]
+
+        def transform(df: pd.DataFrame) -> pd.DataFrame:
+            if rename:
+                df = df.rename(columns=rename)
+            for col, kind in casts.items():
+                df[col] = cast_series(df[col], kind)
+            df = self._validate(df, output_filename)
+            for col, mapping in replace.items():
+                df[col] = df[col].replace(mapping)
+            if ms_columns:
+                self._convert_into_ms(df, ms_columns, output_filename)
+            for col in date_columns:
+                df[col] = to_date(self._parse_datetime(df[col], DATE_FORMAT, output_filename))
+            for right, on in joins:
+                df = df.merge(right, on=on, how="inner")
+            return df[order] if order else df
+
+        return transform
+
+    def constructors_results_processing(self) -> None:
+        self._run_spec("constructors_results_processing")
+
+    def constructors_standings_processing(self) -> None:
+        self._run_spec("constructors_standings_processing")
 
     def drivers_processing(self) -> None:
-        #read the file
-        df = self._read_csv("drivers.csv")
-
-        #remove the unnecessary columns
-        unnecessary_col = ["number", "nationality"]
-        df = df.drop(columns = unnecessary_col)
-
-        #renaming columns
-        rename_map = {
-            "driverId" : "driver_id",
-            "driverRef" : "driver_ref",
-            "code" : "code",
-            "forename" : "forename",
-            "surname" : "surname",
-            "dob" : "dob",
-            "url" : "url"
-        }
-        df = df.rename(columns=rename_map)
-
-        #remove duplicates
-        df = df.drop_duplicates()
-        self._write_csv(df, "drivers_staging.csv")
+        self._run_spec("drivers_processing")
 
     def race_results_processing(self) -> None:
-        #read the file
-        df = self._read_csv("results.csv")
-
-        #remove unnecessary columns
-        unnecessary_col = ["positionText", "positionOrder", "time","fastestLapSpeed"]
-        df = df.drop(columns = unnecessary_col)
-
-        #rename columns
-        rename_map = {
-            "resultId" : "result_id",
-            "raceId" : "race_id",
-            "driverId" : "driver_id",
-            "constructorId" : "constructor_id",
-            "number" : "num", 
-            "grid" : "grid",
-            "position" : "pos",
-            "points" : "points",
-            "laps" : "laps",
-            "milliseconds" : "milliseconds", 
-            "fastestLap" : "fastest_lap",
-            "rank" : "rank",
-            "fastestLapTime" : "fastest_lap_time",
-            "statusId" : "status_id"
-        }
-        df = df.rename(columns=rename_map)
-
-        #conversions of the column point from float to integer
-        df['points'] = df['points'].round().astype('Int64')
-
-        df["fastest_lap_time"] = df["fastest_lap_time"].apply(convert_into_ms)
-
-        #remove duplicates
-        df = df.drop_duplicates()
-        self._write_csv(df, "race_results_staging.csv")
+        self._run_spec("race_results_processing")
 
     def seasons_processing(self) -> None:
-        df = self._read_csv("seasons.csv")
-        #don't need to remove columns
-        #remove duplicates
-        df = df.drop_duplicates()
-        #don't need rename nor reordering
-        self._write_csv(df, "seasons_staging.csv")
-    
+        self._run_spec("seasons_processing")
+
     def weather_processing (self) -> None:
         
         #read the file weather.csv
         df = self._read_csv("weather.csv")
-        df=df.drop_duplicates()
+        df=self._drop_duplicates(df)
         
-        # Split into date (YYYY-MM-DD) and time (HH:MM:SS)
-        df[['date', 'hour']] = df['date'].str.split('T', expand=True)
+        # Parse the timestamps once and split them into date and time of day (see temporal.py)
+        timestamps = self._parse_datetime(df['date'], TIMESTAMP_FORMAT, "weather_staging.csv")
+        df['date'], df['hour'] = split_datetime(timestamps)
 
 
-        # Replace invalid wind_direction values with NaN
-        df.loc[(df['wind_direction'] < 0) | (df['wind_direction'] > 360), 'wind_direction'] = np.nan
+        # Invalid wind_direction, humidity and rainfall values become NaN (see TABLE_CHECKS)
+        df['rainfall'] = pd.to_numeric(df['rainfall'], errors='coerce')
+        df = self._validate(df, "weather_staging.csv")
         df['wind_direction'] = df['wind_direction'].round().astype('Int64')
-        
-        # Replace invalid air_humidity values with NaN
-        df.loc[(df['humidity'] < 0) | (df['humidity'] > 100), 'humidity'] = np.nan
         df['humidity'] = df['humidity'].round().astype('Int64')
-
-        df['rainfall'] = pd.to_numeric(df['rainfall'], errors='coerce')
-        df.loc[~df['rainfall'].isin([0, 1]), 'rainfall'] = np.nan
         df['rainfall'] = df['rainfall'].round().astype('Int64')
         
         #Load races_staging.csv to map meeting_key → race_id
-        races = self._read_csv("races_staging.csv")
-
-        # Keep only necessary columns for merging
-        races = races[['race_id', 'meeting_key']]
+        races = self._read_staging("races_staging.csv", columns=["race_id", "meeting_key"])
 
         # Merge to bring in race_id
         df = df.merge(races, on='meeting_key', how='inner')
@@ -185,66 +441,19 @@ class ETLTransformation:
         df = df[correct_order]
 
         # Write result
-        self._write_csv(df, "weather_staging.csv")
+        self._write_staging(df, "weather_staging.csv")
 
     
     
-    def status_processing (self) -> None:
-        
-        df=self._read_csv("status.csv")
-        df=df.drop_duplicates()
-        
-        rename_map={
-            'statusId' : 'status_id'
-        }
-        
-        df=df.rename(columns=rename_map)
-        
-        df['status_id'] = df['status_id'].astype('Int64')  
-        df['status'] = df['status'].astype(str)
-        
-        self._write_csv(df, "status_staging.csv")
+    def status_processing(self) -> None:
+        self._run_spec("status_processing")
 
-    def circuit_processing (self) -> None:
-        
-        df=self._read_csv("circuits.csv")
-        unnecessary_col = ["circuitRef"]
-        df=df.drop(columns=unnecessary_col)
-        df=df.drop_duplicates()
-        
-        rename_map={
-            'circuitId':'circuit_id'
-
-        }
-        
-        df=df.rename(columns=rename_map)
-        
-        # Convert to numeric first (in case of strings or mixed types)
-        df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-        df['lng'] = pd.to_numeric(df['lng'], errors='coerce')
-        df['alt'] = pd.to_numeric(df['alt'], errors='coerce')
-        df['alt'] = df['alt'].round().astype('Int64')
-        
-        # Replace out-of-range values with NaN
-        df.loc[(df['lat'] < -90) | (df['lat'] > 90), 'lat'] = np.nan
-        df.loc[(df['lng'] < -180) | (df['lng'] > 180), 'lng'] = np.nan
-        df.loc[(df['alt'] < -500) | (df['alt'] > 12000), 'alt'] = np.nan
-        df['circuit_id'] = df['circuit_id'].astype('Int64')  # Nullable integer
-
-        country_map = {
-            'UK': 'United Kingdom',
-            'USA': 'United States',
-            'UAE': 'United Arab Emirates'
-        }
-        df['country'] = df['country'].replace(country_map)
-        
-        self._write_csv(df, "circuits_staging.csv")
+    def circuit_processing(self) -> None:
+        self._run_spec("circuit_processing")
 
     def countries_processing(self) -> None:
-        df=self._read_csv("countries.csv")
-        df=df.drop_duplicates()
-        self._write_csv(df, "countries_staging.csv")
-    
+        self._run_spec("countries_processing")
+
     def races_processing(self) -> None:
         
         # Load CSVs
@@ -255,35 +464,25 @@ class ETLTransformation:
         df_races = df_races[["raceId","year","round","circuitId","name","date","url"]].copy()
         df_meetings = df_meetings[["meeting_key", "meeting_name", "year"]].copy()
         
+        #one row per race, before matching
+        df_races = self._dedupe_key(df_races, ["raceId"], "races_staging.csv")
+
         # Clean names
         df_races['name_clean'] = df_races['name'].str.lower().str.strip()
+        df_races['date'] = to_date(self._parse_datetime(df_races['date'], DATE_FORMAT, "races_staging.csv"))
         df_meetings['meeting_name_clean'] = df_meetings['meeting_name'].str.lower().str.strip()
         
         # Ensure year columns are integers
         df_races['year'] = pd.to_numeric(df_races['year'], errors='coerce').astype('Int64')
         df_meetings['year'] = pd.to_numeric(df_meetings['year'], errors='coerce').astype('Int64')
-        matched_keys = []
+        df_meetings['meeting_key'] = pd.to_numeric(df_meetings['meeting_key'], errors='coerce').astype('Int64')
+
+        # Match every race to the meeting of the same year with the closest name
         THRESHOLD = 85
-        for _, race_row in df_races.iterrows():
-            year = race_row['year']
-            race_name_clean = race_row['name_clean']
-            meetings_in_year = df_meetings[df_meetings['year'] == year]
-
-            if not meetings_in_year.empty:
-                best_match = process.extractOne(
-                    race_name_clean,
-                    meetings_in_year['meeting_name_clean'],
-                    scorer=fuzz.token_sort_ratio
-                )
-                if best_match and best_match[1] >= THRESHOLD:
-                    matched_name = best_match[0]
-                    matched_row = meetings_in_year[meetings_in_year['meeting_name_clean'] == matched_name]
-                    meeting_key = matched_row.iloc[0]['meeting_key']
-                    matched_keys.append(meeting_key)
-                else:
-                    matched_keys.append(pd.NA)
-            else:
-                matched_keys.append(pd.NA)
+        aliases = self._aliases("meetings")
+        matched_keys = match_by_year(df_races, df_meetings, 'name_clean', 'meeting_name_clean', 'meeting_key',
+                                     threshold=THRESHOLD, workers=self.match_workers, aliases=aliases)
+        self._save_aliases(aliases)
         df_races['meeting_key'] = matched_keys
         df_races.drop(columns=['name_clean'], inplace=True)
         
@@ -295,210 +494,73 @@ class ETLTransformation:
         }
         df_races = df_races.rename(columns=rename_map)
         
-        self._write_csv(df_races, "races_staging.csv")
-
-    def constructors_processing(self)-> None:
-
-        df=self._read_csv("constructors.csv")
-
-        df['constructorId'] = pd.to_numeric(df['constructorId'], errors='coerce').astype('Int64')
+        self._write_staging(df_races, "races_staging.csv")
 
+    def constructors_processing(self) -> None:
+        self._run_spec("constructors_processing")
 
-        unnecessary_col = ["constructorRef","nationality"]
-        df=df.drop(columns=unnecessary_col)
-        
-        df=df.drop_duplicates()
-
-        rename_map = {
-            "constructorId" : "constructor_id"
-        }
-
-        df=df.rename(columns=rename_map)
-
-        self._write_csv(df, "constructors_staging.csv")
-
-    def sessions_processing(self)-> None:
-
-        df=self._read_csv("sessions.csv")
-
-        df['session_key'] = pd.to_numeric(df['session_key'], errors='coerce').astype('Int64')
-        df['meeting_key'] = pd.to_numeric(df['meeting_key'], errors='coerce').astype('Int64')
-
-
-        df= df[["meeting_key", "session_key", "session_name"]].copy()
-        
-
-        #Load races_staging.csv to map meeting_key → race_id
-        races = self._read_csv("races_staging.csv")
-
-        # Keep only necessary columns for merging
-        races = races[['race_id', 'meeting_key']]
-
-        # Merge to bring in race_id
-        df = df.merge(races, on=['meeting_key'], how='inner')
-
-        # Drop meeting_key and reorder
-        df = df.drop(columns=['meeting_key'])
-
-        correct_order = ['session_key','race_id','session_name']
-        df = df[correct_order]
-
-
-
-        df=df.drop_duplicates()
-
-
-        self._write_csv(df, "sessions_staging.csv")
-
+    def sessions_processing(self) -> None:
+        self._run_spec("sessions_processing")
 
     def sprint_results_preprocessing(self) -> None:
-        #read the file
-        df = self._read_csv("sprint_results.csv")
-
-        #remove unnecessary columns
-        unnecessary_col = ["positionText", "positionOrder", "time"]
-        df = df.drop(columns = unnecessary_col)
-
-        #rename columns
-        rename_map = {
-            "resultId" : "result_id",
-            "raceId" : "race_id",
-            "driverId" : "driver_id",
-            "constructorId" : "constructor_id",
-            "number" : "num", 
-            "grid" : "grid",
-            "position" : "pos",
-            "points" : "points",
-            "laps" : "laps",
-            "milliseconds" : "milliseconds", 
-            "fastestLap" : "fastest_lap",
-            "rank" : "rank",
-            "fastestLapTime" : "fastest_lap_time",
-            "statusId" : "status_id"
-        }
-        df = df.rename(columns=rename_map)
-
-        #conversions of the column point from float to integer
-        df['points'] = df['points'].round().astype('Int64')
-
-        df["fastest_lap_time"] = df["fastest_lap_time"].apply(convert_into_ms)
-
-        #remove duplicates
-        df = df.drop_duplicates()
-        self._write_csv(df, "sprint_results_staging.csv")
-
-
-    def drivers_standings_processing (self) -> None:
-        #read the file constructor_standings.csv
-        df = self._read_csv("driver_standings.csv")
-        #remove the unnecessary columns, status
-        unnecessary_col = ["positionText"]
-        df = df.drop(columns = unnecessary_col)
-        #check for duplicate
-        df = df.drop_duplicates()
-        #conversions of the column point from float to integer
-        df['points'] = df['points'].round().astype('Int64')
-        #renaming
-        rename_map = {
-            'driverStandingsId': 'drivers_standings_id',
-            'raceId': 'race_id',
-            'driverId': 'driver_id',
-            'points': 'points',
-            'position': 'pos',
-            'wins': 'wins'
-        }
-        df = df.rename(columns=rename_map)
-        self._write_csv(df, "drivers_standings_staging.csv")
-
-    def driver_nationality_processing(self) -> None:
-        df_drivers=self._read_csv("drivers.csv")
-        df_countries=self._read_csv("countries.csv")
+        self._run_spec("sprint_results_preprocessing")
 
+    def drivers_standings_processing(self) -> None:
+        self._run_spec("drivers_standings_processing")
 
-        df_drivers=df_drivers[["driverId","nationality"]].copy()
-        df_countries=df_countries[["nationality"]].copy()
-
+    def _nationality_processing(self, source_filename: str, id_col: str) -> pd.DataFrame:
+        #shared by the driver and constructor steps: one row per (id, nationality) fragment,
+        #with each fragment resolved against the nationalities listed in countries.csv
+        df_source = self._read_csv(source_filename, columns=[id_col, "nationality"])
+        df_countries = self._read_csv("countries.csv", columns=["nationality"])
 
+        #clean form -> original spelling, keeping the first row of every clean form
         df_countries['nationality_clean'] = df_countries['nationality'].str.lower().str.strip()
-        reference_nationalities = df_countries['nationality_clean'].unique().tolist()
+        df_countries = df_countries.dropna(subset=['nationality_clean']).drop_duplicates(subset=['nationality_clean'])
+        clean_to_original = dict(zip(df_countries['nationality_clean'], df_countries['nationality']))
+        reference_nationalities = list(clean_to_original)
+
+        #one row per nationality fragment ("american-italian" -> two rows)
+        df_source['nationality'] = df_source['nationality'].map(split_and_clean)
+        df_source = df_source.explode('nationality').dropna(subset=['nationality'])
 
+        #fuzzy matching runs once per distinct fragment, then the result is mapped back to the rows
         THRESHOLD = 70                  #tune it to get the matching right
-        matched_rows = []
+        aliases = self._aliases("nationalities")
+        matched = resolve_distinct(df_source['nationality'], reference_nationalities, THRESHOLD, aliases=aliases)
+        self._save_aliases(aliases)
+        df_source['nationality'] = df_source['nationality'].map(matched).map(clean_to_original)
 
-        for _, row in df_drivers.iterrows():
-            driver_id = row['driverId']
-            nationality_parts = split_and_clean(row['nationality'])
+        return df_source.dropna(subset=['nationality'])
 
-            for nat in nationality_parts:
-                match = process.extractOne(nat, reference_nationalities, scorer=fuzz.token_sort_ratio)
-                if match and match[1] >= THRESHOLD:
-                    # Get original form from countries
-                    original_nat = df_countries[df_countries['nationality_clean'] == match[0]].iloc[0]['nationality']
-                    matched_rows.append({'driverId': driver_id, 'nationality': original_nat})
+    def driver_nationality_processing(self) -> None:
+        output_df = self._nationality_processing("drivers.csv", "driverId")
 
-                    
-        output_df = pd.DataFrame(matched_rows)
         rename_map={
             "driverId" : "driver_id"
         }
 
         output_df = output_df.rename(columns=rename_map)
-        self._write_csv(output_df, "driver_nationality_staging.csv")
-
-
-
-   
+        self._write_staging(output_df, "driver_nationality_staging.csv")
 
     def constructor_nationality_processing(self) -> None:
-        df_constructors=self._read_csv("constructors.csv")
-        df_countries=self._read_csv("countries.csv")
-
-
-        df_constructors=df_constructors[["constructorId","nationality"]].copy()
-        df_countries=df_countries[["nationality"]].copy()
-
-
-        df_countries['nationality_clean'] = df_countries['nationality'].str.lower().str.strip()
-        reference_nationalities = df_countries['nationality_clean'].unique().tolist()
-
-        THRESHOLD = 70                  #tune it to get the matching right
-        matched_rows = []
+        output_df = self._nationality_processing("constructors.csv", "constructorId")
 
-        for _, row in df_constructors.iterrows():
-            constructor_id = row['constructorId']
-            nationality_parts = split_and_clean(row['nationality'])
-
-            for nat in nationality_parts:
-                match = process.extractOne(nat, reference_nationalities, scorer=fuzz.token_sort_ratio)
-                if match and match[1] >= THRESHOLD:
-                    # Get original form from countries
-                    original_nat = df_countries[df_countries['nationality_clean'] == match[0]].iloc[0]['nationality']
-                    matched_rows.append({'constructorId': constructor_id, 'nationality': original_nat})
-
-                    
-        output_df = pd.DataFrame(matched_rows)
         rename_map={
             "constructorId" : "constructor_id"
         }
 
         output_df = output_df.rename(columns=rename_map)
-        self._write_csv(output_df, "constructor_nationality_staging.csv")
+        self._write_staging(output_df, "constructor_nationality_staging.csv")
 
     def race_lineup_processing(self) -> None:
-        #read the file
+        #read the file, only meeting_key, driver_number and team_colour are parsed (see READ_SCHEMAS)
         df = self._read_csv("drivers_openf1.csv")
 
-        #remove the unnecessary columnss
-        unnecessary_col = ["broadcast_name", "country_code", "first_name","full_name", "headshot_url", "last_name", "name_acronym", "session_key", "team_name"]
-        df.drop(columns = unnecessary_col)
-
        
 
         # read races_staging.csv to retrieve the race_id corresponding to the meeting_key
-        races_df = self._read_csv("races_staging.csv")
-        
-        #remove unnecessary columns
-        races_df = races_df[["race_id", "meeting_key"]]
+        races_df = self._read_staging("races_staging.csv", columns=["race_id", "meeting_key"])
 
         #merge between meeting_key and meeting_key of the two files
         df = df.merge(races_df, left_on="meeting_key", right_on="meeting_key", how="inner")
@@ -507,10 +569,7 @@ class ETLTransformation:
         df = df[["race_id", "driver_number", "team_colour"]]
 
         #read race_results_staging.cvs in order to obtain dirver_id
-        races_staging_df = self._read_csv("race_results_staging.csv")
-
-        #remove unnecessary columns
-        races_staging_df = races_staging_df[["race_id", "driver_id", "num"]]
+        races_staging_df = self._read_staging("race_results_staging.csv", columns=["race_id", "driver_id", "num"])
 
         df["driver_number"] = df["driver_number"].astype(int)
         races_staging_df["num"] = pd.to_numeric(races_staging_df["num"], errors="coerce").astype("Int64")
@@ -531,179 +590,26 @@ class ETLTransformation:
         }
         df = df.rename(columns = rename_map)
         #remove duplicates
-        df = df.drop_duplicates(subset=["race_id", "driver_number"], keep="first")
+        df = self._drop_duplicates(df, subset=["race_id", "driver_number"], keep="first")
         #columns reording
         correct_order = ['race_id', 'driver_id', 'driver_number', 'team_color']
         df = df[correct_order]
 
         #save the result
-        self._write_csv(df, "race_lineup_staging.csv")
+        self._write_staging(df, "race_lineup_staging.csv")
         
         
     def speed_processing(self) -> None:
-        #read the file
-        df = self._read_csv("speed_no_avg.csv")
-
-        #remove duplicate
-        df = df.drop_duplicates()
-
-        #remove unnecessary columns
-        unnecessary_col = ["year"]
-        df = df.drop(columns=unnecessary_col)
-    
-        #replacing the meeting_key with the race_id
-        races_df = self._read_csv("races_staging.csv")
-        #removing the unnecessary columns
-        races_df = races_df[["race_id", "meeting_key"]]
-
-        #retrieve the race_id corresponding to the meeting_key
-        df = df.merge(races_df, left_on="meeting_key", right_on="meeting_key", how = "inner")
-
-        #remove unnecessary columns
-        df = df[["race_id", "driver_number", "session_key", "lap_number", "st_speed"]]
-
-        #renaming columns
-        rename_map = {
-            "race_id" : "race_id", 
-            "session_key" : "session_key",
-            "lap_number" : "lap_number",
-            "st_speed" : "st_speed"
-        }
-        df = df.rename(columns = rename_map)
-
-        #columns reordering
-        correct_order = ['race_id', 'driver_number', 'session_key', 'lap_number', 'st_speed']
-        df = df[correct_order]
-        
-        #save the results
-        self._write_csv(df, "speed_staging.csv")
+        self._run_spec("speed_processing")
 
     def stints_processing(self) -> None:
-        #read the file
-        df = self._read_csv("stints.csv")
-
-        #remove duplicates
-        df = df.drop_duplicates()
-
-        #remove unnecessary_columns
-        unnecessary_col = ["year"]
-        df = df.drop(columns=unnecessary_col)
-
-        #reading the file races_staging.csv to retrieve the race_id corresponding to the meeting_key
-        races_df = self._read_csv("races_staging.csv")
-
-        #remove unnecessary columns
-        races_df = races_df[["race_id", "meeting_key"]]
-
-        #matching between meeting_key and meeting_key
-        df = df.merge(races_df, left_on="meeting_key", right_on="meeting_key", how = "inner")
-
-        #remove unnecessary columns
-        df = df[["driver_number", "race_id", "stint_number", "compound", "lap_start", "lap_end", "session_key", "tyre_age_at_start"]]
-        
-        #converting lap_start and lap_end into integer
-        df['lap_start'] = df['lap_start'].round().astype('Int64')
-        df['lap_end'] = df['lap_end'].round().astype('Int64')
-        #reordering columns
-        correct_order = ["driver_number", "race_id", "stint_number", "compound", "lap_start", "lap_end", "session_key", "tyre_age_at_start"]
-        df = df[correct_order]
-
-        #save the results
-        self._write_csv(df, "stints_staging.csv")
+        self._run_spec("stints_processing")
 
     def lap_times_processing(self) -> None:
-        #read the file
-        df = self._read_csv("lap_times.csv")
-
-        #remove duplicates
-        df = df.drop_duplicates()
-
-        #remove unnecessary columns
-        unnecessary_col = ["time"]
-        df = df.drop(columns=unnecessary_col)
-
-        #renaming columns
-        rename_map = {
-            "raceId" : "race_id",
-            "driverId" :"driver_id",
-            "position" : "pos", 
-            "lap" : "lap_number"
-        }
-        df = df.rename(columns=rename_map)
+        self._run_spec("lap_times_processing")
 
-        #reordering of the columns
-        correct_order = ['race_id', 'driver_id', 'lap_number', 'pos', 'milliseconds']
-        df = df[correct_order]
-
-        #save the results
-        self._write_csv(df, "lap_times_staging.csv")
-        
     def pit_stops_processing(self) -> None:
-        #read the file
-        df = self._read_csv("pit_stops.csv")
-
-        #remove duplicates
-        df = df.drop_duplicates()
-
-        #remove unnecessary columns
-        unnecessary_col = ["time","duration"]
-        df = df.drop(columns=unnecessary_col)
-
-        #renaming columns
-        rename_map = {
-            "raceId" : "race_id",
-            "driverId" : "driver_id", 
-            "stop" : "stop",
-            "lap" : "lap",
-            "milliseconds" : "milliseconds"
-        }
-        df = df.rename(columns=rename_map)
-
-        #reordering columns
-        correct_order = ['race_id', 'driver_id', 'stop', 'lap', 'milliseconds']
-        df = df[correct_order]
-
-        #save the results
-        self._write_csv(df, "pit_stops_staging.csv")                          
+        self._run_spec("pit_stops_processing")
 
     def qualifying_processing(self) -> None:
-        #read the file
-        df = self._read_csv("qualifying.csv")
-
-        #remove duplicates
-        df = df.drop_duplicates()
-
-        #remove unnecessary columns
-        unnecessary_col = ["number"]
-        df = df.drop(columns=unnecessary_col)
-
-        #renaming columns
-        rename_map = {
-            "qualifyId" : "qualify_id",
-            "raceId" : "race_id",
-            "driverId" : "driver_id", 
-            "constructorId" : "constructor_id",
-            "position": "pos"
-        }
-        df = df.rename(columns=rename_map)
-
-        #reordering columns
-        correct_order = ['qualify_id', 'constructor_id', 'race_id', 'driver_id', 'pos', 'q1', 'q2', 'q3']
-        df = df[correct_order]
-        
-        #conversion  of q1, q2 and q3 into ms
-        df["q1"] = df["q1"].apply(convert_into_ms)
-        df["q2"] = df["q2"].apply(convert_into_ms)
-        df["q3"] = df["q3"].apply(convert_into_ms)
-
-        #save the results
-        self._write_csv(df, "qualifying_staging.csv")
-
-
-
-
-
-
-       
-
-
+        self._run_spec("qualifying_processing")
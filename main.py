@@ -1,28 +1,74 @@
-from RDLTransformation import ETLTransformation
+import os
+from pathlib import Path
+from pipeline import STEPS, PipelineError, run_pipeline
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Creates the staging csv from the input files")
+    parser.add_argument("--input-dir", default=os.environ.get("ETL_INPUT_DIR", "etl_transformation/input_files"), help="directory of the input files (default: $ETL_INPUT_DIR)")
+    parser.add_argument("--output-dir", default=os.environ.get("ETL_OUTPUT_DIR", "etl_transformation/output_files"), help="directory of the staging files (default: $ETL_OUTPUT_DIR)")
+    parser.add_argument("--only", nargs="+", choices=list(STEPS), metavar="STEP", default=None, help="run only these steps (the staging tables they read must exist)")
+    parser.add_argument("--skip", nargs="+", choices=list(STEPS), metavar="STEP", default=[], help="don't run these steps")
+    parser.add_argument("--dry-run", action="store_true", help="print the steps that would run and the ones that are up to date, without running them")
+    parser.add_argument("--workers", type=int, default=1, help="number of steps run at the same time")
+    parser.add_argument("--force", action="store_true", help="rebuild every step, even the ones that are up to date")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream lap times and speed this many rows at a time")
+    parser.add_argument("--staging-format", choices=["csv", "parquet"], default="csv", help="format of the staging tables")
+    parser.add_argument("--load", action="store_true", help="COPY every table into postgres as soon as it is produced")
+    parser.add_argument("--dsn", default=None, help="postgres connection string of --load (default: $PG_DSN)")
+    parser.add_argument("--no-staging-files", action="store_true", help="with --load, don't write the staging files")
+    parser.add_argument("--partition-seasons", action="store_true", help="write lap times, speed, stints and pit stops as one file per season")
+    parser.add_argument("--dedupe-policy", choices=["first", "last", "fail"], default="first", help="rows sharing their natural key: keep the first, keep the last or fail")
+    parser.add_argument("--alias-store", default=os.environ.get("ETL_ALIAS_STORE"), help="sqlite file of the fuzzy-matched names, reused by later runs (default: $ETL_ALIAS_STORE, none)")
+    parser.add_argument("--seen-index", default=None, help="directory of the key index of the appended input batches, keys produced (and loaded) by earlier runs are not produced again; the tables can then only be merged (LOAD_MODE 'upsert')")
+    parser.add_argument("--profile", action="store_true", help="write the time, rows and memory of every step to profile_report.json")
+    parser.add_argument("--profile-step", choices=list(STEPS), default=None, help="dump the cProfile stats of this step to <step>.prof")
+    args = parser.parse_args()
 
     #path
-    input_dir = "etl_transformation/input_files"
-    output_dir = "etl_transformation/output_files"
-
-    etl = ETLTransformation(input_dir, output_dir)
-
-    #transformations
-    etl.races_processing()
-    etl.constructor_results_processing()
-    etl.constructor_standings_processing()
-    etl.drivers_processing()
-    etl.race_results_preprocessing()
-    etl.seasons_processing()
-    etl.race_lineup_processing()
-    etl.speed_processing()
-    etl.stints_processing()
-    etl.lap_times_processing()
-    etl.pit_stops_processing()
-    etl.qualifying_processing()
-    etl.stints_processing()
-    
-   
-    print("All the staging csv have been created")
+    input_dir = args.input_dir
+    output_dir = args.output_dir
+
+    #selected steps, in the order of STEPS
+    steps = [step for step in (args.only or STEPS) if step not in args.skip]
+    if not steps:
+        parser.error("no step left to run")
+
+    #the key index only holds the keys of the batches already loaded
+    seen_index = args.seen_index
+    if seen_index and args.force:
+        print("[WARN] --force rebuilds the whole tables, the seen index is not used")
+        seen_index = None
+    if seen_index and args.load:
+        from etl_loading import DELETE_MISSING, LOAD_MODE
+        if LOAD_MODE != "upsert" or DELETE_MISSING:
+            parser.error("--seen-index produces only the new keys, loading them needs LOAD_MODE = 'upsert' "
+                         "without DELETE_MISSING (etl_loading.py)")
+
+    options = dict(steps=steps, workers=args.workers, force=args.force, chunksize=args.chunksize,
+                   staging_format=args.staging_format, profile=args.profile, profile_step=args.profile_step,
+                   partition_seasons=args.partition_seasons, dedupe_policy=args.dedupe_policy,
+                   seen_index_dir=seen_index, alias_store=args.alias_store)
+
+    #transformations, in dependency order
+    try:
+        if args.dry_run:
+            run_pipeline(input_dir, output_dir, dry_run=True, **options)
+        elif args.load:
+            import psycopg2
+            from etl_loading import PG_DSN, PostgresSink, commit_seen_indexes, parse_table_from_filename
+
+            with psycopg2.connect(args.dsn or PG_DSN) as conn:
+                sink = PostgresSink(conn, [parse_table_from_filename(STEPS[step]["output"])[1] for step in steps])
+                sink.open()
+                run_pipeline(input_dir, output_dir, sink=sink, write_files=not args.no_staging_files, **options)
+                sink.close()
+            if seen_index:
+                commit_seen_indexes([Path(seen_index) / f"{Path(STEPS[step]['output']).stem}.keys.npy" for step in steps])
+            print("All the tables have been loaded")
+        else:
+            run_pipeline(input_dir, output_dir, **options)
+            print("All the staging csv have been created")
+    except PipelineError as e:
+        raise SystemExit(f"[ERROR] {e}")
@@ -0,0 +1,86 @@
+import ast
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+class Manifest:
+    #fingerprints of the files and steps of the last runs, stored as json in the output directory.
+    #file hashes are recomputed only when size or mtime changed, and a step is up to date when
+    #the hashes of everything it read and the version of its code are the same as last time
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.files = {}
+        self.steps = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.steps = data.get("steps", {})
+
+    def file_hash(self, path: Path) -> str:
+        #content hash of a file, None if it doesn't exist (or is a directory of partitions)
+        path = Path(path)
+        if not path.is_file():
+            return None
+        stat = path.stat()
+        key = str(path.resolve())
+        known = self.files.get(key)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.files[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def is_current(self, step: str, fingerprint: str, output_path: Path) -> bool:
+        return self.steps.get(step) == fingerprint and Path(output_path).exists()
+
+    def record(self, step: str, fingerprint: str, output_path: Path) -> None:
+        self.steps[step] = fingerprint
+        #hashed now, so that the steps depending on this output see its new content
+        self.file_hash(output_path)
+
+    def forget(self, step: str) -> None:
+        #the step has to run again next time
+        self.steps.pop(step, None)
+
+    def save(self) -> None:
+        #written to a temporary file first, an interrupted run never leaves a truncated manifest
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "steps": self.steps}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def method_sources(path: str, class_name: str) -> dict:
+    #source code of every method of a class, read with ast instead of importing the module (and
+    #pandas with it), so that finding the steps that are up to date stays fast
+    text = Path(path).read_text(encoding="utf-8")
+    lines = text.splitlines(keepends=True)
+    cls = next(node for node in ast.parse(text).body if isinstance(node, ast.ClassDef) and node.name == class_name)
+    #the lines of the method, decorators included
+    return {node.name: "".join(lines[min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1:node.end_lineno])
+            for node in cls.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+
+
+def source_version(*texts) -> str:
+    #hash of the given pieces of source code
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def step_fingerprint(manifest: Manifest, input_paths: list, staging_paths: list, version: str, options: dict) -> str:
+    #a step has to run again when one of the files it reads, its code or its options change
+    parts = {
+        "inputs": {str(p.name): manifest.file_hash(p) for p in input_paths},
+        "staging": {str(p.name): manifest.file_hash(p) for p in staging_paths},
+        "version": version,
+        "options": {k: repr(v) for k, v in sorted(options.items())},
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+#scores every query against every choice with a single score matrix and returns, for each query,
+#the position of the best choice (the first one on ties, like process.extractOne) or -1 when the
+#best score is below the threshold, together with that score. missing queries never match and
+#missing choices are never picked.
+#the default scorer is rapidfuzz's token_sort_ratio; rapidfuzz is imported only when matching runs
+def best_matches(queries, choices, threshold, scorer=None) -> tuple:
+    from rapidfuzz import fuzz, process
+
+    scorer = scorer or fuzz.token_sort_ratio
+    positions = np.full(len(queries), -1, dtype=np.int64)
+    if len(queries) == 0 or len(choices) == 0:
+        return positions, np.full(len(queries), np.nan)
+
+    query_missing = pd.isna(queries)
+    choice_missing = pd.isna(choices)
+    queries = ["" if missing else q for q, missing in zip(queries, query_missing)]
+    choices = ["" if missing else c for c, missing in zip(choices, choice_missing)]
+
+    scores = process.cdist(queries, choices, scorer=scorer, dtype=np.float64)
+    scores[:, choice_missing] = -1
+
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(queries)), best]
+    matched = (best_scores >= threshold) & ~query_missing
+    positions[matched] = best[matched]
+    return positions, best_scores
+
+
+def best_match_positions(queries, choices, threshold, scorer=None) -> np.ndarray:
+    return best_matches(queries, choices, threshold, scorer)[0]
+
+
+def _match_block(args):
+    #worker for a single year: returns the row labels of the block together with the matched
+    #positions and their scores
+    labels, queries, choices, threshold = args
+    return (labels, *best_matches(queries, choices, threshold))
+
+
+#fuzzy-matches left[left_col] against right[right_col] within the same year and returns, aligned to
+#left's index, the right[key_col] of the best match (NA when nothing reaches the threshold).
+#both frames are partitioned by year once and every year block is scored as a whole,
+#optionally spreading the blocks across a process pool.
+#with aliases (alias_store.Aliases), the names already resolved for their year are looked up
+#instead of scored, and the keys found by the scoring are added to them
+def match_by_year(left: pd.DataFrame, right: pd.DataFrame, left_col: str, right_col: str,
+                  key_col: str, threshold: float, year_col: str = "year", workers: int = 1,
+                  aliases=None) -> pd.Series:
+    right_blocks = {
+        year: (block[right_col].to_numpy(dtype=object), block[key_col].to_numpy())
+        for year, block in right.groupby(year_col, sort=False)
+    }
+
+    #empty column with the key dtype, so unmatched rows come out as NA like in a left merge
+    matched = right[key_col].iloc[:0].reindex(left.index)
+    years, tasks = [], []
+    for year, block in left.groupby(year_col, sort=False):
+        if year not in right_blocks:
+            continue
+        choices, keys = right_blocks[year]
+        labels, queries = block.index.to_numpy(), block[left_col].to_numpy(dtype=object)
+        if aliases is not None:
+            known = aliases.positions(queries, keys, context=year)
+            found = known >= 0
+            matched.loc[labels[found]] = keys[known[found]]
+            labels, queries = labels[~found], queries[~found]
+            if len(labels) == 0:
+                continue
+        years.append(year)
+        tasks.append((labels, queries, choices, threshold))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_match_block, tasks))
+    else:
+        results = [_match_block(task) for task in tasks]
+
+    for year, (_, queries, _, _), (labels, positions, scores) in zip(years, tasks, results):
+        _, keys = right_blocks[year]
+        found = positions >= 0
+        matched.loc[labels[found]] = keys[positions[found]]
+        if aliases is not None:
+            aliases.add(queries[found], keys[positions[found]], scores[found], context=year)
+    return matched
+
+
+#matches each distinct token once against the reference values, in a single batch, and returns
+#the dict token -> matched reference value for the tokens that reach the threshold.
+#with aliases (alias_store.Aliases), only the tokens they don't resolve are scored
+def resolve_distinct(tokens, reference, threshold: float, scorer=None, aliases=None) -> dict:
+    tokens = pd.unique(pd.Series(tokens, dtype=object).dropna())
+    resolved = {}
+    if aliases is not None:
+        known = aliases.positions(tokens, reference)
+        resolved = {token: reference[pos] for token, pos in zip(tokens, known) if pos >= 0}
+        tokens = tokens[known < 0]
+    positions, scores = best_matches(tokens, reference, threshold, scorer=scorer)
+    found = positions >= 0
+    if aliases is not None:
+        aliases.add(tokens[found], [reference[pos] for pos in positions[found]], scores[found])
+    resolved.update({token: reference[pos] for token, pos in zip(tokens, positions) if pos >= 0})
+    return resolved
@@ -0,0 +1,288 @@
+import time
+from pathlib import Path
+from staging_format import partition_dirname, staging_filename
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+#what every ETLTransformation step reads and writes: input files from the input directory,
+#staging tables produced by other steps, and the staging table it produces
+STEPS = {
+    "races_processing": {"inputs": ["races.csv", "meetings.csv"], "staging": [], "output": "races_staging.csv"},
+    "constructors_results_processing": {"inputs": ["constructor_results.csv"], "staging": [], "output": "constructors_results_staging.csv"},
+    "constructors_standings_processing": {"inputs": ["constructor_standings.csv"], "staging": [], "output": "constructors_standings_staging.csv"},
+    "drivers_processing": {"inputs": ["drivers.csv"], "staging": [], "output": "drivers_staging.csv"},
+    "race_results_processing": {"inputs": ["results.csv"], "staging": [], "output": "race_results_staging.csv"},
+    "seasons_processing": {"inputs": ["seasons.csv"], "staging": [], "output": "seasons_staging.csv"},
+    "weather_processing": {"inputs": ["weather.csv"], "staging": ["races_staging.csv"], "output": "weather_staging.csv"},
+    "status_processing": {"inputs": ["status.csv"], "staging": [], "output": "status_staging.csv"},
+    "circuit_processing": {"inputs": ["circuits.csv"], "staging": [], "output": "circuits_staging.csv"},
+    "countries_processing": {"inputs": ["countries.csv"], "staging": [], "output": "countries_staging.csv"},
+    "constructors_processing": {"inputs": ["constructors.csv"], "staging": [], "output": "constructors_staging.csv"},
+    "sessions_processing": {"inputs": ["sessions.csv"], "staging": ["races_staging.csv"], "output": "sessions_staging.csv"},
+    "sprint_results_preprocessing": {"inputs": ["sprint_results.csv"], "staging": [], "output": "sprint_results_staging.csv"},
+    "drivers_standings_processing": {"inputs": ["driver_standings.csv"], "staging": [], "output": "drivers_standings_staging.csv"},
+    "driver_nationality_processing": {"inputs": ["drivers.csv", "countries.csv"], "staging": [], "output": "driver_nationality_staging.csv"},
+    "constructor_nationality_processing": {"inputs": ["constructors.csv", "countries.csv"], "staging": [], "output": "constructor_nationality_staging.csv"},
+    "race_lineup_processing": {"inputs": ["drivers_openf1.csv"], "staging": ["races_staging.csv", "race_results_staging.csv"], "output": "race_lineup_staging.csv"},
+    "speed_processing": {"inputs": ["speed_no_avg.csv"], "staging": ["races_staging.csv"], "output": "speed_staging.csv"},
+    "stints_processing": {"inputs": ["stints.csv"], "staging": ["races_staging.csv"], "output": "stints_staging.csv"},
+    "lap_times_processing": {"inputs": ["lap_times.csv"], "staging": [], "output": "lap_times_staging.csv"},
+    "pit_stops_processing": {"inputs": ["pit_stops.csv"], "staging": [], "output": "pit_stops_staging.csv"},
+    "qualifying_processing": {"inputs": ["qualifying.csv"], "staging": [], "output": "qualifying_staging.csv"},
+}
+
+#staging tables that some step reads back
+STAGING_INPUTS = {filename for spec in STEPS.values() for filename in spec["staging"]}
+
+#fact tables that can be written as one file per season (ETLTransformation partition_seasons):
+#the season of every row comes from races_staging.csv, which the steps then read as well
+PARTITIONED_OUTPUTS = {"lap_times_staging.csv", "speed_staging.csv", "stints_staging.csv", "pit_stops_staging.csv"}
+
+#steps whose fuzzy matching goes through the alias store (ETLTransformation alias_store)
+ALIAS_STEPS = {"races_processing", "driver_nationality_processing", "constructor_nationality_processing"}
+
+#options that change what only some of the steps write
+STEP_OPTIONS = {
+    "partition_seasons": {step for step, spec in STEPS.items() if spec["output"] in PARTITIONED_OUTPUTS},
+    "alias_store": ALIAS_STEPS,
+}
+
+
+def step_staging(step: str, partition_seasons: bool = False) -> list:
+    staging = list(STEPS[step]["staging"])
+    if partition_seasons and STEPS[step]["output"] in PARTITIONED_OUTPUTS and "races_staging.csv" not in staging:
+        staging.append("races_staging.csv")
+    return staging
+
+
+def step_output_path(output_dir: Path, step: str, staging_format: str = "csv", partition_seasons: bool = False) -> Path:
+    #staging file written by the step, or the directory of its partitions
+    output = STEPS[step]["output"]
+    if partition_seasons and output in PARTITIONED_OUTPUTS:
+        return Path(output_dir) / partition_dirname(output)
+    return Path(output_dir) / staging_filename(output, staging_format)
+
+
+class PipelineError(Exception):
+    pass
+
+
+def build_dag(steps: list, input_dir: str, output_dir: str, staging_format: str = "csv",
+              partition_seasons: bool = False) -> dict:
+    #returns step -> set of the selected steps it depends on, after checking that no step is
+    #listed twice, that every step exists and that all its inputs are available
+    duplicates = sorted({s for s in steps if steps.count(s) > 1})
+    if duplicates:
+        raise PipelineError(f"Duplicate steps: {duplicates}")
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        raise PipelineError(f"Unknown steps: {unknown}")
+
+    producers = {STEPS[s]["output"]: s for s in steps}
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    deps, missing = {}, []
+    for step in steps:
+        deps[step] = set()
+        for filename in STEPS[step]["inputs"]:
+            if not (input_dir / filename).exists():
+                missing.append(f"{step}: {filename}")
+        for filename in step_staging(step, partition_seasons):
+            if filename in producers:
+                deps[step].add(producers[filename])
+            elif not _staging_path(input_dir, output_dir, filename, staging_format).exists():
+                #not produced in this run and not left by a previous one
+                missing.append(f"{step}: {filename}")
+    if missing:
+        raise PipelineError(f"Missing inputs: {missing}")
+    return deps
+
+
+def critical_path(deps: dict, durations: dict = None) -> tuple:
+    #longest chain of dependent steps, weighted by their duration (1 per step when not known yet)
+    durations = durations or {}
+    finish, previous = {}, {}
+
+    def visit(step):
+        if step not in finish:
+            best = max(deps[step], key=visit, default=None)
+            previous[step] = best
+            finish[step] = durations.get(step, 1) + (finish[best] if best else 0)
+        return finish[step]
+
+    last = max(deps, key=visit, default=None)
+    path = []
+    while last:
+        path.append(last)
+        last = previous[last]
+    return path[::-1], (finish[path[0]] if path else 0)
+
+
+#options of ETLTransformation that change how fast a step runs but not what it writes
+RUNTIME_OPTIONS = {"match_workers", "cache_entries", "cache_max_bytes", "sink", "write_files", "profile", "profile_step"}
+
+
+#helper modules of ETLTransformation whose code is part of the version of every step: the read
+#schemas and the staging reader/writer change what a step writes as much as the transformations
+STEP_MODULES = ["utility", "matching", "dedupe", "table_specs", "temporal", "validation", "alias_store", "schemas",
+                "staging_format", "staging_cache"]
+
+
+def _step_versions(steps: list) -> dict:
+    #version of the code of every step: its own method, the private helpers of the class and the
+    #helper modules (table specs included), so that editing any of them rebuilds the step.
+    #the sources are read from the files, etl_class and its dependencies are not imported
+    from manifest import method_sources, source_version
+    here = Path(__file__).parent
+    methods = method_sources(here / "etl_class.py", "ETLTransformation")
+    helpers = [source for name, source in methods.items() if name.startswith("_")]
+    modules = [(here / f"{name}.py").read_text(encoding="utf-8") for name in STEP_MODULES]
+    return {step: source_version(methods[step], *helpers, *modules) for step in steps}
+
+
+def _staging_path(input_dir: Path, output_dir: Path, filename: str, staging_format: str) -> Path:
+    #same lookup as ETLTransformation._read_staging
+    filename = staging_filename(filename, staging_format)
+    path = output_dir / filename
+    return path if path.exists() else input_dir / filename
+
+
+def _run_step(input_dir: str, output_dir: str, step: str, etl_options: dict) -> tuple:
+    #runs one step in a worker process, which owns its own ETLTransformation (and cache)
+    from etl_class import ETLTransformation
+    etl = ETLTransformation(input_dir, output_dir, **etl_options)
+    start = time.perf_counter()
+    record = etl.run_step(step)
+    return step, time.perf_counter() - start, record
+
+
+def run_pipeline(input_dir: str, output_dir: str, steps: list = None, workers: int = 1,
+                 force: bool = False, dry_run: bool = False, **etl_options) -> dict:
+    #runs the steps in dependency order, up to `workers` at the same time on a process pool;
+    #with a single worker everything runs in this process and shares one staging cache.
+    #steps whose inputs, upstream staging tables and code are unchanged since the last run
+    #(see manifest.json in the output directory) are skipped, unless force is set.
+    #with a sink every step runs, in this process, in the order the sink loads the tables.
+    #with profile=True the measures of every step that ran are written to profile_report.json.
+    #with dry_run=True nothing runs: the plan (step -> "run" or "skip") is printed and returned
+    from manifest import Manifest, step_fingerprint
+
+    steps = list(STEPS) if steps is None else list(steps)
+    if etl_options.get("sink") is not None:
+        from etl_loading import LOAD_ORDER, parse_table_from_filename
+        if workers > 1:
+            raise PipelineError("A sink can only be used with a single worker")
+        force = True
+        position = {table: i for i, table in enumerate(LOAD_ORDER)}
+        steps.sort(key=lambda s: position.get(parse_table_from_filename(STEPS[s]["output"])[1], len(LOAD_ORDER)))
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    if not dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    staging_format = etl_options.get("staging_format", "csv")
+    partition_seasons = etl_options.get("partition_seasons", False)
+    deps = build_dag(steps, input_dir, output_dir, staging_format, partition_seasons)
+    manifest = Manifest(output_dir / "manifest.json")
+    versions = _step_versions(steps)
+    options = {k: v for k, v in etl_options.items() if k not in RUNTIME_OPTIONS}
+    if options.get("alias_store") is not None:
+        #the manual overrides of the store change what the matching steps write
+        from alias_store import AliasStore
+        options["alias_store"] = (options["alias_store"], AliasStore(options["alias_store"]).overrides_version())
+    durations, skipped, fingerprints, records = {}, [], {}, []
+
+    def output_path(step):
+        return step_output_path(output_dir, step, staging_format, partition_seasons)
+
+    def current(step):
+        #computes the fingerprint of a step whose dependencies are done: True if it is up to date
+        fingerprints[step] = step_fingerprint(
+            manifest,
+            [input_dir / f for f in STEPS[step]["inputs"]],
+            [_staging_path(input_dir, output_dir, f, staging_format) for f in step_staging(step, partition_seasons)],
+            versions[step], {k: v for k, v in options.items() if k not in STEP_OPTIONS or step in STEP_OPTIONS[k]})
+        return not force and manifest.is_current(step, fingerprints[step], output_path(step))
+
+    def ready(step, done):
+        #True if the step has to run
+        if current(step):
+            print(f"Skipping {step} (up to date)")
+            skipped.append(step)
+            done.add(step)
+            return False
+        print(f"Running {step}")
+        return True
+
+    def finished(step):
+        if etl_options.get("write_files", True):
+            manifest.record(step, fingerprints[step], output_path(step))
+        else:
+            #no staging file was written: the one left on disk (if any) is out of date
+            manifest.forget(step)
+        manifest.save()
+
+    if dry_run:
+        #a step runs when it is out of date or when one of the steps it reads runs before it
+        plan = {}
+        while len(plan) < len(steps):
+            step = next(s for s in steps if s not in plan and deps[s] <= set(plan))
+            upstream = sorted(d for d in deps[step] if plan[d] == "run")
+            plan[step] = "run" if upstream or not current(step) else "skip"
+            print(f"{plan[step]:<4}  {step}" + (f" (after {', '.join(upstream)})" if upstream else ""))
+        print(f"{list(plan.values()).count('run')} of {len(plan)} steps would run")
+        return {"plan": plan}
+
+    if workers <= 1:
+        #created by the first step that runs: a run where everything is up to date never imports
+        #etl_class (and pandas)
+        etl = None
+        done = set()
+        while len(done) < len(steps):
+            #steps keep the given order among the ones that are ready
+            step = next(s for s in steps if s not in done and deps[s] <= done)
+            if not ready(step, done):
+                continue
+            if etl is None:
+                from etl_class import ETLTransformation
+                etl = ETLTransformation(input_dir, output_dir, **etl_options)
+            start = time.perf_counter()
+            record = etl.run_step(step)
+            durations[step] = time.perf_counter() - start
+            if record is not None:
+                records.append(record)
+            finished(step)
+            done.add(step)
+    else:
+        done, running, failed = set(), {}, []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while len(done) < len(steps) and not failed:
+                for step in steps:
+                    if step not in done and step not in running.values() and deps[step] <= done:
+                        if ready(step, done):
+                            running[pool.submit(_run_step, str(input_dir), str(output_dir), step, etl_options)] = step
+                if not running:
+                    #everything left was skipped
+                    continue
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    step = running.pop(future)
+                    try:
+                        _, durations[step], record = future.result()
+                        if record is not None:
+                            records.append(record)
+                        finished(step)
+                        done.add(step)
+                    except Exception as e:
+                        failed.append(f"{step}: {e}")
+            #let the steps already started finish before reporting the failure
+            wait(running)
+        if failed:
+            raise PipelineError(f"Failed steps: {failed}")
+
+    #skipped steps take no time on the path
+    path, length = critical_path(deps, {**dict.fromkeys(skipped, 0.0), **durations})
+    print(f"Critical path ({length:.2f}s): {' -> '.join(path)}")
+    if etl_options.get("profile"):
+        from profiling import write_report
+        write_report(output_dir / "profile_report.json", records, workers=workers, skipped=skipped,
+                     critical_path=path, critical_path_seconds=round(length, 4))
+        print(f"Profile report written to {output_dir / 'profile_report.json'}")
+    return {"durations": durations, "skipped": skipped, "critical_path": path, "critical_path_seconds": length}
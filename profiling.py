@@ -0,0 +1,65 @@
+#instrumentation of the ETLTransformation steps: wall and cpu time, rows read and written,
+#duplicates removed, rows rejected by the checks, names found in the alias store and added to it, bytes read and
+#written and peak memory of every step, collected in a json
+#report. ETLTransformation only calls the profiler when profiling is turned on
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+COUNTERS = ("rows_in", "rows_out", "duplicates_removed", "rows_rejected", "alias_hits", "aliases_added",
+            "bytes_read", "bytes_written")
+
+
+class StepProfiler:
+    def __init__(self):
+        self.current = None
+
+    def count(self, **counters) -> None:
+        #adds to the counters of the step that is running (nothing outside of a step)
+        if self.current is None:
+            return
+        for name, value in counters.items():
+            self.current[name] += int(value)
+
+    @contextmanager
+    def step(self, name: str, profile_path: Path = None):
+        #measures the step run inside the block; with profile_path the step also runs under
+        #cProfile and the stats are dumped there
+        record = {"step": name, **dict.fromkeys(COUNTERS, 0)}
+        self.current = record
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile() if profile_path is not None else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+                record["cprofile"] = str(profile_path)
+            record["wall_seconds"] = round(time.perf_counter() - wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu, 4)
+            record["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            if started_tracing:
+                tracemalloc.stop()
+            self.current = None
+
+
+def write_report(path: Path, records: list, **run_info) -> None:
+    #one entry per step in the order they finished, plus the totals of the run
+    totals = {name: sum(r[name] for r in records) for name in COUNTERS}
+    totals["wall_seconds"] = round(sum(r["wall_seconds"] for r in records), 4)
+    totals["cpu_seconds"] = round(sum(r["cpu_seconds"] for r in records), 4)
+    totals["peak_mb"] = max((r["peak_mb"] for r in records), default=0)
+    report = {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"), **run_info,
+              "steps": records, "totals": totals}
+    Path(path).write_text(json.dumps(report, indent=2))
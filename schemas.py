@@ -0,0 +1,97 @@
+#read schema of every input file: the columns the steps actually use ("usecols") and the dtype
+#they are parsed with. integers get the smallest width that fits them (nullable when the source
+#can leave them blank) and the low-cardinality strings become categories. columns that can hold
+#the \N placeholder of the ergast files, or text that is cleaned later, are left to inference.
+#files without an entry (e.g. countries.csv, whose layout varies) are read whole
+READ_SCHEMAS = {
+    "circuits.csv": {
+        "usecols": ["circuitId", "name", "location", "country", "lat", "lng", "alt", "url"],
+        "dtype": {"circuitId": "int32"},
+    },
+    "constructor_results.csv": {
+        "usecols": ["constructorResultsId", "raceId", "constructorId", "points"],
+        "dtype": {"constructorResultsId": "int32", "raceId": "int32", "constructorId": "int32", "points": "float64"},
+    },
+    "constructor_standings.csv": {
+        "usecols": ["constructorStandingsId", "raceId", "constructorId", "points", "position", "wins"],
+        "dtype": {"constructorStandingsId": "int32", "raceId": "int32", "constructorId": "int32",
+                  "points": "float64", "position": "Int16", "wins": "int16"},
+    },
+    "constructors.csv": {
+        "usecols": ["constructorId", "name", "nationality", "url"],
+        "dtype": {"constructorId": "int32"},
+    },
+    "driver_standings.csv": {
+        "usecols": ["driverStandingsId", "raceId", "driverId", "points", "position", "wins"],
+        "dtype": {"driverStandingsId": "int32", "raceId": "int32", "driverId": "int32",
+                  "points": "float64", "position": "Int16", "wins": "int16"},
+    },
+    "drivers.csv": {
+        "usecols": ["driverId", "driverRef", "code", "forename", "surname", "dob", "nationality", "url"],
+        "dtype": {"driverId": "int32"},
+    },
+    "drivers_openf1.csv": {
+        "usecols": ["meeting_key", "driver_number", "team_colour"],
+        "dtype": {"meeting_key": "Int32", "driver_number": "Int16", "team_colour": "category"},
+    },
+    "lap_times.csv": {
+        #"time" is dropped: it is the same information as "milliseconds"
+        "usecols": ["raceId", "driverId", "lap", "position", "milliseconds"],
+        "dtype": {"raceId": "int32", "driverId": "int32", "lap": "int16", "position": "int16", "milliseconds": "int32"},
+    },
+    "meetings.csv": {
+        "usecols": ["meeting_key", "meeting_name", "year"],
+        "dtype": {"meeting_key": "Int32", "year": "Int16"},
+    },
+    "pit_stops.csv": {
+        #"time" (time of day) and "duration" (same as "milliseconds") are not loaded
+        "usecols": ["raceId", "driverId", "stop", "lap", "milliseconds"],
+        "dtype": {"raceId": "int32", "driverId": "int32", "stop": "int8", "lap": "int16", "milliseconds": "int32"},
+    },
+    "qualifying.csv": {
+        "usecols": ["qualifyId", "raceId", "driverId", "constructorId", "position", "q1", "q2", "q3"],
+        "dtype": {"qualifyId": "int32", "raceId": "int32", "driverId": "int32", "constructorId": "int32",
+                  "position": "Int16"},
+    },
+    "races.csv": {
+        "usecols": ["raceId", "year", "round", "circuitId", "name", "date", "url"],
+        "dtype": {"raceId": "int32", "year": "int16", "round": "int8", "circuitId": "int32"},
+    },
+    "results.csv": {
+        "usecols": ["resultId", "raceId", "driverId", "constructorId", "number", "grid", "position", "points",
+                    "laps", "milliseconds", "fastestLap", "rank", "fastestLapTime", "statusId"],
+        "dtype": {"resultId": "int32", "raceId": "int32", "driverId": "int32", "constructorId": "int32",
+                  "grid": "int16", "points": "float64", "laps": "int16", "statusId": "int16"},
+    },
+    "seasons.csv": {
+        "dtype": {"year": "int16"},
+    },
+    "sessions.csv": {
+        "usecols": ["meeting_key", "session_key", "session_name"],
+        "dtype": {"meeting_key": "Int32", "session_key": "Int32", "session_name": "category"},
+    },
+    "speed_no_avg.csv": {
+        #lap_number can be blank, so it is a nullable int. every column is declared: the streamed
+        #reads (--chunksize) keep undeclared columns as text, and both reads must write the same values
+        "dtype": {"year": "int16", "meeting_key": "int32", "session_key": "int32", "driver_number": "int16",
+                  "lap_number": "Int16", "st_speed": "float64"},
+    },
+    "sprint_results.csv": {
+        "usecols": ["resultId", "raceId", "driverId", "constructorId", "number", "grid", "position", "points",
+                    "laps", "milliseconds", "fastestLap", "fastestLapTime", "statusId"],
+        "dtype": {"resultId": "int32", "raceId": "int32", "driverId": "int32", "constructorId": "int32",
+                  "grid": "int16", "points": "float64", "laps": "int16", "statusId": "int16"},
+    },
+    "status.csv": {
+        "dtype": {"statusId": "int16", "status": "category"},
+    },
+    "stints.csv": {
+        "dtype": {"year": "int16", "meeting_key": "int32", "session_key": "int32", "driver_number": "int16",
+                  "stint_number": "int8", "compound": "category", "tyre_age_at_start": "Int16"},
+    },
+    "weather.csv": {
+        "usecols": ["air_temperature", "date", "humidity", "meeting_key", "pressure", "rainfall", "session_key",
+                    "track_temperature", "wind_direction", "wind_speed"],
+        "dtype": {"meeting_key": "Int32", "session_key": "Int32"},
+    },
+}
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import pandas as pd
+
+
+class StagingCache:
+    #keeps the staging frames of the current run in memory so that later steps don't parse the csv again.
+    #the least recently used frames are evicted when there are more than max_entries of them or,
+    #if max_bytes is set, when together they take more memory than that. pinned frames are never
+    #evicted (they count towards the limits all the same)
+    def __init__(self, max_entries: int = 8, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._pinned = set()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def get(self, name: str, columns: list = None) -> pd.DataFrame:
+        #returns a copy of the cached frame, or of only some of its columns (so the caller can
+        #modify it), or None
+        if name not in self._frames:
+            return None
+        self._frames.move_to_end(name)
+        df = self._frames[name]
+        return (df if columns is None else df[columns]).copy()
+
+    def put(self, name: str, df: pd.DataFrame, pinned: bool = False) -> None:
+        self.discard(name)
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if not pinned and (self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes)):
+            #a frame that alone doesn't fit is not cached at all
+            return
+        self._frames[name] = df
+        self._sizes[name] = size
+        if pinned:
+            self._pinned.add(name)
+        self._evict()
+
+    def discard(self, name: str) -> None:
+        self._frames.pop(name, None)
+        self._sizes.pop(name, None)
+        self._pinned.discard(name)
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self._sizes.clear()
+        self._pinned.clear()
+
+    def _evict(self) -> None:
+        while len(self._frames) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            name = next((n for n in self._frames if n not in self._pinned), None)
+            if name is None:
+                break
+            self.discard(name)
@@ -0,0 +1,125 @@
+#reading and writing of the staging tables in the supported formats. csv is the default, parquet
+#(through pyarrow) keeps the dtypes of the frames, is compressed and can read only some columns.
+#a table can also be split into partitions: a directory named after the table with one file per
+#value of the partition key ("lap_times_staging/season=2021.csv").
+#pandas and pyarrow are imported only when a table is actually read or written
+from pathlib import Path
+
+STAGING_SUFFIXES = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+}
+PARTITION_KEY = "season"
+
+
+def check_format(staging_format: str) -> None:
+    if staging_format not in STAGING_SUFFIXES:
+        raise ValueError(f"Unknown staging format {staging_format!r}, expected one of {sorted(STAGING_SUFFIXES)}")
+
+
+def staging_filename(filename: str, staging_format: str) -> str:
+    #"races_staging.csv" -> name of the same table in the given format
+    return str(Path(filename).with_suffix(STAGING_SUFFIXES[staging_format]))
+
+
+def partition_dirname(filename: str) -> str:
+    #"lap_times_staging.csv" -> directory holding the partitions of the table
+    return Path(filename).stem
+
+
+def partition_filename(value, staging_format: str) -> str:
+    return f"{PARTITION_KEY}={value}{STAGING_SUFFIXES[staging_format]}"
+
+
+def remove_partitions(directory: Path) -> None:
+    #deletes the partition files of a table, and the directory if nothing else is left in it
+    directory = Path(directory)
+    if not directory.is_dir():
+        return
+    for path in directory.glob(f"{PARTITION_KEY}=*"):
+        path.unlink()
+    if not any(directory.iterdir()):
+        directory.rmdir()
+
+
+def write_staging(df, path: Path, staging_format: str) -> None:
+    #date and time columns are written in their canonical form (see temporal.py)
+    from temporal import arrow_temporal, format_temporal
+    if staging_format == "parquet":
+        arrow_temporal(df).to_parquet(path, index=False)
+    else:
+        format_temporal(df).to_csv(path, index=False)
+
+
+def read_staging(path: Path, staging_format: str, columns: list = None):
+    import pandas as pd
+    if staging_format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+class StagingWriter:
+    #appends frames to a staging table one chunk at a time; with parquet every chunk becomes a
+    #row group and is cast to the schema of the first one
+    def __init__(self, path: Path, staging_format: str):
+        self.path = Path(path)
+        self.staging_format = staging_format
+        self._file = None
+        self._parquet = None
+        self._schema = None
+
+    def __enter__(self):
+        if self.staging_format == "csv":
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+        return self
+
+    def write(self, df) -> None:
+        from temporal import arrow_temporal, format_temporal
+        if self.staging_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            df = arrow_temporal(df)
+            if self._parquet is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema = table.schema
+                self._parquet = pq.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            self._parquet.write_table(table)
+        else:
+            format_temporal(df).to_csv(self._file, index=False, header=self._file.tell() == 0)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+        return False
+
+
+class PartitionedStagingWriter:
+    #StagingWriter for a partitioned table: every frame is split by the labels that
+    #partition_of(frame) returns for its rows and each part is appended to the file of its
+    #partition. the partitions left by a previous run are removed first
+    def __init__(self, directory: Path, staging_format: str, partition_of):
+        self.directory = Path(directory)
+        self.staging_format = staging_format
+        self.partition_of = partition_of
+        self._writers = {}
+
+    def __enter__(self):
+        remove_partitions(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def write(self, df) -> None:
+        for value, part in df.groupby(self.partition_of(df), sort=True):
+            if value not in self._writers:
+                path = self.directory / partition_filename(value, self.staging_format)
+                self._writers[value] = StagingWriter(path, self.staging_format).__enter__()
+            self._writers[value].write(part)
+
+    def __exit__(self, *exc):
+        for writer in self._writers.values():
+            writer.__exit__(*exc)
+        return False
@@ -0,0 +1,241 @@
+#synthetic input files with the layout of the Ergast and OpenF1 exports read by ETLTransformation.
+#the keys are consistent across the files (every lap, result and stint belongs to a generated race
+#and driver, every OpenF1 meeting to a race of the same year with the same name) and the size
+#grows with the number of seasons and of drivers, so the pipeline can be measured at any scale
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+GRANDS_PRIX = [
+    ("Bahrain", "Bahraini"), ("Saudi Arabian", "Saudi"), ("Australian", "Australian"), ("Japanese", "Japanese"),
+    ("Chinese", "Chinese"), ("Miami", "American"), ("Emilia Romagna", "Italian"), ("Monaco", "Monegasque"),
+    ("Canadian", "Canadian"), ("Spanish", "Spanish"), ("Austrian", "Austrian"), ("British", "British"),
+    ("Hungarian", "Hungarian"), ("Belgian", "Belgian"), ("Dutch", "Dutch"), ("Italian", "Italian"),
+    ("Azerbaijan", "Azerbaijani"), ("Singapore", "Singaporean"), ("United States", "American"),
+    ("Mexico City", "Mexican"), ("São Paulo", "Brazilian"), ("Las Vegas", "American"), ("Qatar", "Qatari"),
+    ("Abu Dhabi", "Emirati"),
+]
+COUNTRIES = [
+    ("Bahrain", "Bahraini"), ("Saudi Arabia", "Saudi"), ("Australia", "Australian"), ("Japan", "Japanese"),
+    ("China", "Chinese"), ("United States", "American"), ("Italy", "Italian"), ("Monaco", "Monegasque"),
+    ("Canada", "Canadian"), ("Spain", "Spanish"), ("Austria", "Austrian"), ("United Kingdom", "British"),
+    ("Hungary", "Hungarian"), ("Belgium", "Belgian"), ("Netherlands", "Dutch"), ("Azerbaijan", "Azerbaijani"),
+    ("Singapore", "Singaporean"), ("Mexico", "Mexican"), ("Brazil", "Brazilian"), ("Qatar", "Qatari"),
+    ("United Arab Emirates", "Emirati"), ("Germany", "German"), ("Finland", "Finnish"), ("France", "French"),
+    ("Denmark", "Danish"), ("Thailand", "Thai"), ("New Zealand", "New Zealander"), ("Argentina", "Argentine"),
+]
+STATUSES = ["Finished", "+1 Lap", "+2 Laps", "Engine", "Gearbox", "Collision", "Accident", "Retired"]
+COMPOUNDS = ["SOFT", "MEDIUM", "HARD", "INTERMEDIATE", "WET"]
+SESSIONS = ["Practice 1", "Practice 2", "Practice 3", "Qualifying", "Race"]
+TEAM_COLOURS = ["3671C6", "FF8000", "27F4D2", "E8002D", "229971", "64C4FF", "B6BABD", "52E252", "FF87BC", "6692FF"]
+
+LAPS = 57                #laps of every race
+WEATHER_SAMPLES = 60     #weather rows of every session (one a minute)
+
+
+def _lap_time_text(ms: np.ndarray) -> np.ndarray:
+    #"m:ss.mmm" as written by Ergast
+    return np.char.add(np.char.add((ms // 60000).astype(str), ":"),
+                       np.char.add(np.char.zfill(((ms // 1000) % 60).astype(str), 2),
+                                   np.char.add(".", np.char.zfill((ms % 1000).astype(str), 3))))
+
+
+def _write(df: pd.DataFrame, output_dir: Path, filename: str, sizes: dict) -> None:
+    df.to_csv(output_dir / filename, index=False)
+    sizes[filename] = len(df)
+
+
+def generate_inputs(output_dir: str, seasons: int = 3, drivers: int = 20, last_year: int = 2024,
+                    seed: int = 0) -> dict:
+    #writes every input file of the pipeline into output_dir, returns filename -> number of rows
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sizes = {}
+
+    years = np.arange(last_year - seasons + 1, last_year + 1)
+    rounds = len(GRANDS_PRIX)
+    constructors = max(drivers // 2, 1)
+
+    #ergast reference tables
+    _write(pd.DataFrame({"year": years, "url": [f"http://en.wikipedia.org/wiki/{y}_Formula_One_World_Championship"
+                                                 for y in years]}), output_dir, "seasons.csv", sizes)
+    _write(pd.DataFrame({"statusId": np.arange(1, len(STATUSES) + 1), "status": STATUSES}),
+           output_dir, "status.csv", sizes)
+    _write(pd.DataFrame(COUNTRIES, columns=["country_name", "nationality"]), output_dir, "countries.csv", sizes)
+    circuit_country = [country for country, _ in COUNTRIES[:16]] + ["Azerbaijan", "Singapore", "USA", "Mexico",
+                                                                   "Brazil", "USA", "Qatar", "UAE"]
+    _write(pd.DataFrame({
+        "circuitId": np.arange(1, rounds + 1),
+        "circuitRef": [f"circuit_{i}" for i in range(rounds)],
+        "name": [f"{name} Circuit" for name, _ in GRANDS_PRIX],
+        "location": [name for name, _ in GRANDS_PRIX],
+        "country": circuit_country,
+        "lat": rng.uniform(-60, 60, rounds).round(4),
+        "lng": rng.uniform(-170, 170, rounds).round(4),
+        "alt": rng.integers(0, 2300, rounds),
+        "url": [f"http://en.wikipedia.org/wiki/Circuit_{i}" for i in range(rounds)],
+    }), output_dir, "circuits.csv", sizes)
+
+    nationalities = [nationality for _, nationality in COUNTRIES]
+    driver_ids = np.arange(1, drivers + 1)
+    _write(pd.DataFrame({
+        "driverId": driver_ids,
+        "driverRef": [f"driver_{i}" for i in driver_ids],
+        "number": driver_ids.astype(str),
+        "code": [f"D{i:02d}" for i in driver_ids % 100],
+        "forename": [f"Name{i}" for i in driver_ids],
+        "surname": [f"Surname{i}" for i in driver_ids],
+        "dob": [f"19{70 + i % 30}-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in driver_ids],
+        #a few double nationalities, as in the real file
+        "nationality": [nationalities[i % len(nationalities)] if i % 17 else
+                        f"{nationalities[i % len(nationalities)]}-{nationalities[(i + 1) % len(nationalities)]}"
+                        for i in driver_ids],
+        "url": [f"http://en.wikipedia.org/wiki/Driver_{i}" for i in driver_ids],
+    }), output_dir, "drivers.csv", sizes)
+    constructor_ids = np.arange(1, constructors + 1)
+    _write(pd.DataFrame({
+        "constructorId": constructor_ids,
+        "constructorRef": [f"team_{i}" for i in constructor_ids],
+        "name": [f"Team {i}" for i in constructor_ids],
+        "nationality": [nationalities[(3 * i) % len(nationalities)] for i in constructor_ids],
+        "url": [f"http://en.wikipedia.org/wiki/Team_{i}" for i in constructor_ids],
+    }), output_dir, "constructors.csv", sizes)
+
+    #one race for every grand prix of every season
+    race_year = np.repeat(years, rounds)
+    race_round = np.tile(np.arange(1, rounds + 1), seasons)
+    race_ids = np.arange(1, len(race_year) + 1)
+    race_names = [f"{GRANDS_PRIX[r - 1][0]} Grand Prix" for r in race_round]
+    _write(pd.DataFrame({
+        "raceId": race_ids, "year": race_year, "round": race_round, "circuitId": race_round, "name": race_names,
+        "date": [f"{y}-{3 + (r - 1) * 9 // rounds:02d}-{1 + (r * 7) % 28:02d}" for y, r in zip(race_year, race_round)],
+        "time": "15:00:00",
+        "url": [f"http://en.wikipedia.org/wiki/{y}_{name.replace(' ', '_')}" for y, name in zip(race_year, race_names)],
+    }), output_dir, "races.csv", sizes)
+
+    #results: every driver in every race, finishing order shuffled
+    n_races = len(race_ids)
+    res_race = np.repeat(race_ids, drivers)
+    res_driver = np.tile(driver_ids, n_races)
+    position = np.argsort(rng.random((n_races, drivers)), axis=1).ravel() + 1
+    finished = position <= max(drivers - 3, 1)
+    points = np.clip(26 - 2 * position, 0, None).astype(float)
+    fastest_ms = rng.integers(78000, 98000, len(res_race))
+    results = pd.DataFrame({
+        "resultId": np.arange(1, len(res_race) + 1), "raceId": res_race, "driverId": res_driver,
+        "constructorId": (res_driver - 1) % constructors + 1, "number": res_driver,
+        "grid": np.argsort(rng.random((n_races, drivers)), axis=1).ravel() + 1,
+        "position": np.where(finished, position.astype(str), r"\N"), "positionText": position,
+        "positionOrder": position, "points": points, "laps": np.where(finished, LAPS, rng.integers(1, LAPS, len(res_race))),
+        "time": r"\N", "milliseconds": np.where(finished, (5400000 + position * 1500).astype(str), r"\N"),
+        "fastestLap": rng.integers(2, LAPS + 1, len(res_race)), "rank": position,
+        "fastestLapTime": _lap_time_text(fastest_ms), "fastestLapSpeed": rng.uniform(190, 240, len(res_race)).round(3),
+        "statusId": np.where(finished, 1, rng.integers(2, len(STATUSES) + 1, len(res_race))),
+    })
+    _write(results, output_dir, "results.csv", sizes)
+
+    #sprints on one weekend out of four
+    sprint = results[results["raceId"] % 4 == 0].drop(columns=["rank", "fastestLapSpeed"]).copy()
+    sprint["resultId"] = np.arange(len(results) + 1, len(results) + len(sprint) + 1)
+    sprint["points"] = np.clip(9 - sprint["positionOrder"], 0, None).astype(float)
+    _write(sprint, output_dir, "sprint_results.csv", sizes)
+
+    q_time = rng.integers(76000, 92000, len(res_race))
+    _write(pd.DataFrame({
+        "qualifyId": np.arange(1, len(res_race) + 1), "raceId": res_race, "driverId": res_driver,
+        "constructorId": (res_driver - 1) % constructors + 1, "number": res_driver, "position": position,
+        "q1": _lap_time_text(q_time + 1200),
+        "q2": np.where(position <= 15, _lap_time_text(q_time + 600), r"\N"),
+        "q3": np.where(position <= 10, _lap_time_text(q_time), r"\N"),
+    }), output_dir, "qualifying.csv", sizes)
+
+    #standings after every race
+    cons_race = np.repeat(race_ids, constructors)
+    _write(pd.DataFrame({
+        "constructorResultsId": np.arange(1, len(cons_race) + 1), "raceId": cons_race,
+        "constructorId": np.tile(constructor_ids, n_races), "points": rng.integers(0, 44, len(cons_race)).astype(float),
+        "status": r"\N",
+    }), output_dir, "constructor_results.csv", sizes)
+    cons_position = np.argsort(rng.random((n_races, constructors)), axis=1).ravel() + 1
+    _write(pd.DataFrame({
+        "constructorStandingsId": np.arange(1, len(cons_race) + 1), "raceId": cons_race,
+        "constructorId": np.tile(constructor_ids, n_races), "points": rng.integers(0, 600, len(cons_race)).astype(float),
+        "position": cons_position, "positionText": cons_position, "wins": rng.integers(0, 5, len(cons_race)),
+    }), output_dir, "constructor_standings.csv", sizes)
+    _write(pd.DataFrame({
+        "driverStandingsId": np.arange(1, len(res_race) + 1), "raceId": res_race, "driverId": res_driver,
+        "points": rng.integers(0, 450, len(res_race)).astype(float), "position": position, "positionText": position,
+        "wins": rng.integers(0, 5, len(res_race)),
+    }), output_dir, "driver_standings.csv", sizes)
+
+    #every lap of every driver, and two pit stops each
+    lap_race = np.repeat(res_race, LAPS)
+    lap_driver = np.repeat(res_driver, LAPS)
+    lap_ms = rng.integers(78000, 98000, len(lap_race))
+    _write(pd.DataFrame({
+        "raceId": lap_race, "driverId": lap_driver, "lap": np.tile(np.arange(1, LAPS + 1), len(res_race)),
+        "position": np.repeat(position, LAPS), "time": _lap_time_text(lap_ms), "milliseconds": lap_ms,
+    }), output_dir, "lap_times.csv", sizes)
+    pit_ms = rng.integers(19000, 30000, 2 * len(res_race))
+    _write(pd.DataFrame({
+        "raceId": np.repeat(res_race, 2), "driverId": np.repeat(res_driver, 2), "stop": np.tile([1, 2], len(res_race)),
+        "lap": np.tile([LAPS // 3, 2 * LAPS // 3], len(res_race)), "time": "15:45:12",
+        "duration": (pit_ms / 1000).round(3), "milliseconds": pit_ms,
+    }), output_dir, "pit_stops.csv", sizes)
+
+    #openf1: one meeting per race, the five sessions of the weekend
+    meeting_keys = 1000 + race_ids
+    _write(pd.DataFrame({"meeting_key": meeting_keys, "meeting_name": race_names, "year": race_year,
+                         "country_name": [circuit_country[r - 1] for r in race_round]}),
+           output_dir, "meetings.csv", sizes)
+    sess_meeting = np.repeat(meeting_keys, len(SESSIONS))
+    session_keys = 9000 + np.arange(len(sess_meeting))
+    sess_year = np.repeat(race_year, len(SESSIONS))
+    _write(pd.DataFrame({
+        "meeting_key": sess_meeting, "session_key": session_keys, "session_name": np.tile(SESSIONS, n_races),
+        "session_type": np.tile(SESSIONS, n_races), "date_start": [f"{y}-06-01T12:00:00+00:00" for y in sess_year],
+        "year": sess_year,
+    }), output_dir, "sessions.csv", sizes)
+    w_session = np.repeat(session_keys, WEATHER_SAMPLES)
+    minute = np.tile(np.arange(WEATHER_SAMPLES), len(session_keys))
+    _write(pd.DataFrame({
+        "air_temperature": rng.uniform(12, 38, len(w_session)).round(1),
+        "date": [f"{y}-06-01T12:{m:02d}:05.{m * 7 % 1000:03d}000+00:00"
+                 for y, m in zip(np.repeat(sess_year, WEATHER_SAMPLES), minute)],
+        "humidity": rng.integers(20, 95, len(w_session)), "meeting_key": np.repeat(sess_meeting, WEATHER_SAMPLES),
+        "pressure": rng.uniform(990, 1025, len(w_session)).round(1), "rainfall": (rng.random(len(w_session)) < 0.05).astype(int),
+        "session_key": w_session, "track_temperature": rng.uniform(18, 55, len(w_session)).round(1),
+        "wind_direction": rng.integers(0, 360, len(w_session)), "wind_speed": rng.uniform(0, 8, len(w_session)).round(1),
+    }), output_dir, "weather.csv", sizes)
+
+    #race session telemetry
+    race_sessions = session_keys[len(SESSIONS) - 1::len(SESSIONS)]
+    entry_meeting = np.repeat(meeting_keys, drivers)
+    entry_session = np.repeat(race_sessions, drivers)
+    entry_year = np.repeat(race_year, drivers)
+    _write(pd.DataFrame({
+        "broadcast_name": [f"N SURNAME{i}" for i in res_driver], "country_code": "GBR", "driver_number": res_driver,
+        "first_name": [f"Name{i}" for i in res_driver], "full_name": [f"Name{i} SURNAME{i}" for i in res_driver],
+        "headshot_url": "https://example.com/headshot.png", "last_name": [f"Surname{i}" for i in res_driver],
+        "meeting_key": entry_meeting, "name_acronym": [f"D{i:02d}" for i in res_driver % 100],
+        "session_key": entry_session, "team_colour": [TEAM_COLOURS[(i - 1) % constructors % len(TEAM_COLOURS)] for i in res_driver],
+        "team_name": [f"Team {(i - 1) % constructors + 1}" for i in res_driver],
+    }), output_dir, "drivers_openf1.csv", sizes)
+    speed = rng.integers(280, 345, len(lap_race)).astype(float)
+    speed[rng.random(len(speed)) < 0.02] = np.nan
+    _write(pd.DataFrame({
+        "year": np.repeat(entry_year, LAPS), "meeting_key": np.repeat(entry_meeting, LAPS),
+        "session_key": np.repeat(entry_session, LAPS), "driver_number": lap_driver,
+        "lap_number": np.tile(np.arange(1, LAPS + 1), len(res_race)), "st_speed": speed,
+    }), output_dir, "speed_no_avg.csv", sizes)
+    stint_start = np.array([1, LAPS // 3 + 1, 2 * LAPS // 3 + 1])
+    stint_end = np.array([LAPS // 3, 2 * LAPS // 3, LAPS])
+    _write(pd.DataFrame({
+        "year": np.repeat(entry_year, 3), "meeting_key": np.repeat(entry_meeting, 3),
+        "session_key": np.repeat(entry_session, 3), "stint_number": np.tile([1, 2, 3], len(res_race)),
+        "driver_number": np.repeat(res_driver, 3), "lap_start": np.tile(stint_start, len(res_race)).astype(float),
+        "lap_end": np.tile(stint_end, len(res_race)).astype(float),
+        "compound": rng.choice(COMPOUNDS[:3], 3 * len(res_race)), "tyre_age_at_start": rng.integers(0, 4, 3 * len(res_race)),
+    }), output_dir, "stints.csv", sizes)
+    return sizes
@@ -0,0 +1,147 @@
+#declarative description of the steps that reshape a single input file, run by
+#ETLTransformation._run_spec. the output table of a step is the one declared in pipeline.STEPS.
+#every spec is compiled into one pass over the frame (or over every chunk when streaming):
+#
+#  source   input file, read with only the "columns" kept (default: its READ_SCHEMAS usecols)
+#  key      natural key of the output table: one row is kept per key, according to the dedupe
+#           policy of ETLTransformation, hashing only the key columns
+#  dedupe   without a key, "input" (default) drops duplicate rows as soon as they are read,
+#           "output" once the table is built
+#  rename   old name -> new name, the later keys use the new names
+#  casts    column -> "round" (numeric, rounded to a nullable integer), "numeric" (coerced to a
+#           number) or any dtype accepted by astype. the checks of the output table
+#           (validation.TABLE_CHECKS) run right after the casts
+#  replace  column -> {value: replacement}
+#  ms       M:SS.mmm columns converted into milliseconds
+#  dates    YYYY-MM-DD columns parsed into dates (see temporal.py)
+#  joins    inner joins with staging tables: {"table", "on", "columns"} adds "columns" of "table"
+#           matched on "on"
+#  order    output columns, in order (default: all of them)
+#  stream   the step can stream its input `chunksize` rows at a time (dedupe must be by key or "input")
+#
+#steps with logic of their own (fuzzy matching, nationality fragments, weather readings, the
+#race lineup) stay as methods of ETLTransformation
+
+SPEC_KEYS = {"source", "columns", "key", "dedupe", "rename", "casts", "replace", "ms", "dates", "joins", "order", "stream"}
+
+#race_id of the meeting, from races_staging.csv
+RACE_ID_JOIN = {"table": "races_staging.csv", "on": "meeting_key", "columns": ["race_id"]}
+
+#results.csv and sprint_results.csv share the layout (sprint results have no rank)
+RESULTS_SPEC = {
+    "key": ["result_id"],
+    "rename": {"resultId": "result_id", "raceId": "race_id", "driverId": "driver_id",
+               "constructorId": "constructor_id", "number": "num", "position": "pos",
+               "fastestLap": "fastest_lap", "fastestLapTime": "fastest_lap_time", "statusId": "status_id"},
+    "casts": {"points": "round"},
+    "ms": ["fastest_lap_time"],
+}
+
+TABLE_SPECS = {
+    "constructors_results_processing": {
+        "source": "constructor_results.csv",
+        "key": ["constructors_results_id"],
+        "rename": {"constructorResultsId": "constructors_results_id", "raceId": "race_id",
+                   "constructorId": "constructor_id"},
+        "casts": {"points": "round"},
+        "order": ["constructors_results_id", "race_id", "constructor_id", "points"],
+    },
+    "constructors_standings_processing": {
+        "source": "constructor_standings.csv",
+        "key": ["constructors_standings_id"],
+        "rename": {"constructorStandingsId": "constructors_standings_id", "raceId": "race_id",
+                   "constructorId": "constructor_id", "position": "pos"},
+        "casts": {"points": "round"},
+    },
+    "drivers_processing": {
+        "source": "drivers.csv",
+        "key": ["driver_id"],
+        #number and nationality are not needed (nationality has its own step)
+        "columns": ["driverId", "driverRef", "code", "forename", "surname", "dob", "url"],
+        "rename": {"driverId": "driver_id", "driverRef": "driver_ref"},
+        "dates": ["dob"],
+    },
+    "race_results_processing": {**RESULTS_SPEC, "source": "results.csv"},
+    "sprint_results_preprocessing": {**RESULTS_SPEC, "source": "sprint_results.csv"},
+    "seasons_processing": {
+        "source": "seasons.csv",
+        "key": ["year"],
+    },
+    "status_processing": {
+        "source": "status.csv",
+        "key": ["status_id"],
+        "rename": {"statusId": "status_id"},
+        "casts": {"status_id": "Int64", "status": "str"},
+    },
+    "circuit_processing": {
+        "source": "circuits.csv",
+        "key": ["circuit_id"],
+        "rename": {"circuitId": "circuit_id"},
+        "casts": {"lat": "numeric", "lng": "numeric", "alt": "round", "circuit_id": "Int64"},
+        "replace": {"country": {"UK": "United Kingdom", "USA": "United States", "UAE": "United Arab Emirates"}},
+    },
+    "countries_processing": {
+        "source": "countries.csv",
+    },
+    "constructors_processing": {
+        "source": "constructors.csv",
+        "key": ["constructor_id"],
+        #constructorRef and nationality are not needed
+        "columns": ["constructorId", "name", "url"],
+        "rename": {"constructorId": "constructor_id"},
+        "casts": {"constructor_id": "Int64"},
+    },
+    "sessions_processing": {
+        "source": "sessions.csv",
+        "key": ["session_key"],
+        "casts": {"session_key": "Int64", "meeting_key": "Int64"},
+        "joins": [RACE_ID_JOIN],
+        "order": ["session_key", "race_id", "session_name"],
+    },
+    "drivers_standings_processing": {
+        "source": "driver_standings.csv",
+        "key": ["drivers_standings_id"],
+        "rename": {"driverStandingsId": "drivers_standings_id", "raceId": "race_id", "driverId": "driver_id",
+                   "position": "pos"},
+        "casts": {"points": "round"},
+    },
+    "speed_processing": {
+        "source": "speed_no_avg.csv",
+        #year is implied by the meeting
+        "columns": ["meeting_key", "session_key", "driver_number", "lap_number", "st_speed"],
+        "joins": [RACE_ID_JOIN],
+        "order": ["race_id", "driver_number", "session_key", "lap_number", "st_speed"],
+        "stream": True,
+    },
+    "stints_processing": {
+        "source": "stints.csv",
+        "key": ["race_id", "session_key", "driver_number", "stint_number"],
+        "columns": ["meeting_key", "session_key", "stint_number", "driver_number", "lap_start", "lap_end",
+                    "compound", "tyre_age_at_start"],
+        "casts": {"lap_start": "round", "lap_end": "round"},
+        "joins": [RACE_ID_JOIN],
+        "order": ["driver_number", "race_id", "stint_number", "compound", "lap_start", "lap_end", "session_key",
+                  "tyre_age_at_start"],
+    },
+    "lap_times_processing": {
+        "source": "lap_times.csv",
+        "key": ["race_id", "driver_id", "lap_number"],
+        "rename": {"raceId": "race_id", "driverId": "driver_id", "position": "pos", "lap": "lap_number"},
+        "order": ["race_id", "driver_id", "lap_number", "pos", "milliseconds"],
+        "stream": True,
+    },
+    "pit_stops_processing": {
+        "source": "pit_stops.csv",
+        "key": ["race_id", "driver_id", "stop"],
+        "rename": {"raceId": "race_id", "driverId": "driver_id"},
+        "order": ["race_id", "driver_id", "stop", "lap", "milliseconds"],
+    },
+    "qualifying_processing": {
+        "source": "qualifying.csv",
+        "key": ["qualify_id"],
+        "rename": {"qualifyId": "qualify_id", "raceId": "race_id", "driverId": "driver_id",
+                   "constructorId": "constructor_id", "position": "pos"},
+        "ms": ["q1", "q2", "q3"],
+        "order": ["qualify_id", "constructor_id", "race_id", "driver_id", "pos", "q1", "q2", "q3"],
+    },
+}
@@ -0,0 +1,87 @@
+#date and time columns: every column is parsed with an explicit format in one vectorised
+#to_datetime call, the frames keep timestamps as datetime64, the columns declared as dates as
+#period[D] (see to_date) and times of day as timedelta64, and the staging files get them in a
+#fixed canonical form that postgres reads on COPY without guessing: YYYY-MM-DD,
+#YYYY-MM-DD HH:MM:SS.ffffff and HH:MM:SS.ffffff as text, date32, timestamp and time64 in parquet.
+#the form follows the dtype of the column, never its values
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%Y-%m-%d"          #ergast dates (races date, drivers dob)
+TIMESTAMP_FORMAT = "ISO8601"      #openf1 timestamps, e.g. 2023-03-05T14:00:05.123000+00:00
+
+
+def parse_datetime(series: pd.Series, fmt: str) -> tuple:
+    #returns the naive UTC datetimes together with the number of malformed values set to NaT
+    #(blanks and the \N placeholder are missing values, not malformed ones)
+    text = series.astype("string")
+    missing = text.isna() | (text == r"\N")
+    parsed = pd.to_datetime(text.mask(missing), format=fmt, errors="coerce", utc=True).dt.tz_localize(None)
+    rejected = int((parsed.isna() & ~missing).sum())
+    return parsed, rejected
+
+
+def to_date(series: pd.Series) -> pd.Series:
+    #datetimes -> the dates they fall on, as period[D]: the writers tell them from timestamps
+    return series.dt.to_period("D")
+
+
+def split_datetime(series: pd.Series) -> tuple:
+    #datetimes -> (date, time of day)
+    return to_date(series), series - series.dt.normalize()
+
+
+def _is_date(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.PeriodDtype) and series.dtype.freq.name == "D"
+
+
+def _day_numbers(series: pd.Series) -> np.ndarray:
+    #days since 1970-01-01 of a period[D] column (NaT stays the int64 minimum)
+    return series.array.asi8
+
+
+def _date_text(series: pd.Series) -> pd.Series:
+    text = np.datetime_as_string(_day_numbers(series).view("datetime64[D]"), unit="D")
+    return pd.Series(text, index=series.index, dtype="string").mask(series.isna())
+
+
+def _datetime_text(series: pd.Series) -> pd.Series:
+    text = np.datetime_as_string(series.to_numpy(dtype="datetime64[us]"), unit="us")
+    return pd.Series(np.char.replace(text, "T", " "), index=series.index, dtype="string").mask(series.isna())
+
+
+def _time_text(series: pd.Series) -> pd.Series:
+    #the time of day is formatted as the time part of 1970-01-01 + time
+    values = np.datetime64(0, "us") + series.to_numpy(dtype="timedelta64[us]")
+    text = pd.Series(np.datetime_as_string(values, unit="us"), index=series.index, dtype="string")
+    return text.str.slice(11).mask(series.isna())
+
+
+def format_temporal(df: pd.DataFrame) -> pd.DataFrame:
+    #text form of the date and time columns, for the csv staging files and the COPY streams;
+    #frames without such columns are returned as they are
+    columns = {}
+    for col in df.columns:
+        if _is_date(df[col]):
+            columns[col] = _date_text(df[col])
+        elif df[col].dtype.kind == "M":
+            columns[col] = _datetime_text(df[col])
+        elif df[col].dtype.kind == "m":
+            columns[col] = _time_text(df[col])
+    return df.assign(**columns) if columns else df
+
+
+def arrow_temporal(df: pd.DataFrame) -> pd.DataFrame:
+    #parquet form: the dates become arrow date32 and the times of day time64 (pyarrow would store
+    #them as pandas periods and durations)
+    import pyarrow as pa
+
+    columns = {}
+    for col in df.columns:
+        if _is_date(df[col]):
+            days = pa.array(_day_numbers(df[col]).astype("int32"), mask=df[col].isna().to_numpy(), type=pa.int32())
+            columns[col] = pd.Series(days.cast(pa.date32()), index=df.index, dtype=pd.ArrowDtype(pa.date32()))
+        elif df[col].dtype.kind == "m":
+            micros = pa.array(df[col].to_numpy(dtype="timedelta64[us]").astype("int64"), mask=df[col].isna().to_numpy())
+            columns[col] = pd.Series(micros.cast(pa.time64("us")), index=df.index, dtype=pd.ArrowDtype(pa.time64("us")))
+    return df.assign(**columns) if columns else df
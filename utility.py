@@ -1,5 +1,8 @@
 import pandas as pd
 
+#M:SS.mmm, with the same tolerance for blanks and signs that int() has on each part
+LAP_TIME_PATTERN = r"^\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*\.\s*([+-]?\d+)\s*$"
+
 #utility function for converting a time string into ms
 def convert_into_ms(time_str):
         if pd.isna(time_str):
@@ -9,9 +12,32 @@ def convert_into_ms(time_str):
             seconds, milliseconds = rest.split(".")
             total_ms = int(minutes) * 60 * 1000 + int(seconds) * 1000 + int(milliseconds)
             return total_ms
-        except:
+        except (AttributeError, ValueError):
             return pd.NA 
-        
+
+#column-level version of convert_into_ms: parses the whole series in one pass and
+#returns the Int64 milliseconds together with the number of malformed values set to NA
+def convert_series_into_ms(series):
+    text = series.astype("string")
+    missing = text.isna() | (text == r"\N")
+    parts = text.str.extract(LAP_TIME_PATTERN)
+    minutes = pd.to_numeric(parts[0], errors="coerce").astype("Int64")
+    seconds = pd.to_numeric(parts[1], errors="coerce").astype("Int64")
+    milliseconds = pd.to_numeric(parts[2], errors="coerce").astype("Int64")
+    total_ms = minutes * 60 * 1000 + seconds * 1000 + milliseconds
+    rejected = int((total_ms.isna() & ~missing).sum())
+    return total_ms, rejected
+
+
+#casts of the table specs (see table_specs.py): "round" rounds a numeric column to a nullable
+#integer, "numeric" coerces it to a number, anything else is passed to astype
+def cast_series(series, kind):
+    if kind == "round":
+        return pd.to_numeric(series, errors="coerce").round().astype("Int64")
+    if kind == "numeric":
+        return pd.to_numeric(series, errors="coerce")
+    return series.astype(kind)
+
 
 def split_and_clean(nationality_field):
     if pd.isna(nationality_field):
@@ -0,0 +1,92 @@
+#declarative constraints of the staging tables, checked by ETLTransformation._validate in one
+#vectorised pass over the frame. every rule names a column and one check:
+#  range     (low, high), bounds included
+#  allowed   the values the column can take
+#  not_null  the value must be present
+#  regex     the whole value must match the pattern
+#and a policy for the rows that break it: "null" (default) empties the value, "drop" removes the
+#row. missing values (and the \N placeholder) only break not_null. the rows that break a rule are
+#written, with their values before the policy and the rules they break, to rejects/<table>_rejects.csv
+import numpy as np
+import pandas as pd
+
+POLICIES = ("null", "drop")
+CHECKS = ("range", "allowed", "not_null", "regex")
+REJECTS_DIR = "rejects"
+
+TABLE_CHECKS = {
+    "circuits_staging.csv": [
+        {"column": "lat", "range": (-90, 90)},
+        {"column": "lng", "range": (-180, 180)},
+        {"column": "alt", "range": (-500, 12000)},
+    ],
+    "weather_staging.csv": [
+        {"column": "wind_direction", "range": (0, 360)},
+        {"column": "humidity", "range": (0, 100)},
+        {"column": "rainfall", "allowed": [0, 1]},
+    ],
+}
+
+
+def rule_name(rule: dict) -> str:
+    #"lat:range"
+    return f"{rule['column']}:{next(check for check in CHECKS if check in rule)}"
+
+
+def check_rules(table: str, rules: list) -> None:
+    for rule in rules:
+        checks = [check for check in CHECKS if check in rule]
+        if len(checks) != 1:
+            raise ValueError(f"{table}: every rule needs exactly one of {CHECKS}, got {rule}")
+        if rule.get("policy", "null") not in POLICIES:
+            raise ValueError(f"{table}: unknown policy in {rule}, expected one of {POLICIES}")
+
+
+def _missing(series: pd.Series) -> np.ndarray:
+    missing = series.isna().to_numpy(dtype=bool)
+    if series.dtype.kind == "O" or pd.api.types.is_string_dtype(series.dtype):
+        missing = missing | (series.astype(object) == r"\N").to_numpy(dtype=bool)
+    return missing
+
+
+def _broken(series: pd.Series, missing: np.ndarray, rule: dict) -> np.ndarray:
+    #mask of the rows whose value breaks the rule
+    if "not_null" in rule:
+        return missing
+    if "range" in rule:
+        low, high = rule["range"]
+        broken = (series < low) | (series > high)
+    elif "allowed" in rule:
+        broken = ~series.isin(rule["allowed"])
+    else:
+        broken = ~series.astype("string").str.fullmatch(rule["regex"])
+    return pd.Series(broken).fillna(False).to_numpy(dtype=bool) & ~missing
+
+
+def validate(df: pd.DataFrame, rules: list) -> tuple:
+    #returns the valid frame, the rejected rows (with a "rules" column) and the count of every rule.
+    #all the masks are computed first, then every column is emptied once and the rows dropped once
+    masks = {}
+    missing = {}
+    for rule in rules:
+        col = rule["column"]
+        if col not in missing:
+            missing[col] = _missing(df[col])
+        masks[rule_name(rule)] = _broken(df[col], missing[col], rule)
+    counts = {name: int(mask.sum()) for name, mask in masks.items()}
+    if not any(counts.values()):
+        return df, df.iloc[:0], counts
+
+    broken = np.column_stack(list(masks.values()))
+    rejected = broken.any(axis=1)
+    names = np.array(list(masks))
+    rejects = df[rejected].assign(rules=[";".join(names[row]) for row in broken[rejected]])
+
+    to_null, to_drop = {}, np.zeros(len(df), dtype=bool)
+    for rule, mask in zip(rules, masks.values()):
+        if rule.get("policy", "null") == "drop":
+            to_drop |= mask
+        else:
+            to_null[rule["column"]] = to_null.get(rule["column"], False) | mask
+    df = df.assign(**{col: df[col].mask(mask) for col, mask in to_null.items() if mask.any()})
+    return df[~to_drop] if to_drop.any() else df, rejects, counts